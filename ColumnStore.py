@@ -0,0 +1,162 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+from array import array
+from itertools import compress
+from operator import ne
+
+BLOCK = 1024    # Values compared at once by the replica consistency check
+
+class ColumnStore(object):
+    """
+    Column store keeps the latest committed state of a site in flat arrays indexed by slot,
+    where a slot is the position of a variable at the site (variables are interned by their index i for xi).
+    Dumps, readable bitmaps, and consistency checks across replicas work on whole arrays instead of Variable objects.
+    Committed values must be integers.
+
+    Args:
+        data_table (dict): Variables stored at the site, in dump order
+    """
+    def __init__(self, data_table: dict):
+        """
+        Constructor for initializing a column store from the variables of a site.
+        """
+        n = len(data_table)
+        self.slot = {v_id: k for k, v_id in enumerate(data_table)}                  # Variable ID -> slot
+        self.numbers = array('l', (int(v_id[1:]) for v_id in data_table))           # Slot -> variable number
+        self.values = array('q', (int(v.current().val) for v in data_table.values()))    # Latest committed values
+        self.ts = array('q', (v.current().ts for v in data_table.values()))         # Commit timestamps of the values
+        self.unreplicated = bytearray(not v.replicated for v in data_table.values())    # Non-replicated bitmap
+        self.readable = bytearray(b'\x01') * n                                      # Readable bitmap
+        # Replicated variables again, contiguous in the order of their numbers, for comparing replicas across sites
+        replicated = bytes(v.replicated for v in data_table.values())
+        self.replica_slot = array('l', [-1]) * n                                   # Slot -> replica slot, -1 if not replicated
+        for j, k in enumerate(compress(range(n), replicated)):
+            self.replica_slot[k] = j
+        self.replica_numbers = array('l', compress(self.numbers, replicated))      # Replica slot -> variable number
+        self.replica_values = array('q', compress(self.values, replicated))        # Latest committed values of the replicas
+        self.replica_readable = bytearray(b'\x01') * len(self.replica_numbers)     # Readable bitmap of the replicas
+        self.placement = self.replica_numbers.tobytes()     # Key shared by the sites storing the same replicated variables
+
+    def commit(self, v_id: str, val, ts: int):
+        """
+        Store a committed value.
+
+        Args:
+            v_id (str): Variable ID
+            val (int): Committed value
+            ts (int): Timestamp of the commit
+        """
+        k = self.slot[v_id]
+        self.values[k] = int(val)
+        self.ts[k] = ts
+        self.readable[k] = 1
+        j = self.replica_slot[k]
+        if j >= 0:
+            self.replica_values[j] = self.values[k]
+            self.replica_readable[j] = 1
+
+    def recover(self):
+        """
+        Mark every replicated variable unreadable after the site recovers.
+        """
+        self.readable[:] = self.unreplicated
+        self.replica_readable[:] = bytes(len(self.replica_readable))
+
+    def readable_variables(self):
+        """
+        Get the numbers of the readable variables.
+
+        Returns:
+            list[int]: Variable numbers (i for xi) that are readable at the site
+        """
+        return list(compress(self.numbers, self.readable))
+
+    def variables(self):
+        """
+        Get the latest committed values in dump order.
+
+        Returns:
+            dict: Variable ID -> latest committed value
+        """
+        return dict(zip(self.slot, self.values))
+
+    def readable_items(self):
+        """
+        Get the numbers and latest committed values of the readable variables.
+
+        Returns:
+            tuple: List of variable numbers and list of their values
+        """
+        return list(compress(self.numbers, self.readable)), list(compress(self.values, self.readable))
+
+def compare_blocks(numbers, reference, referenced, values, readable, conflicts: set):
+    """
+    Compare the replicated variables of a site with a reference built from sites storing the same replicated variables.
+    Blocks equal to the reference, unreadable at the site, or not readable in the reference yet are handled with 
+    whole-block operations; only the other blocks are compared value by value. Values readable at the site and 
+    not in the reference are copied to it.
+
+    Args:
+        numbers (array): Numbers of the replicated variables
+        reference (array): Reference values, updated in place
+        referenced (bytearray): Readable bitmap of the reference, updated in place
+        values (array): Values of the site
+        readable (bytearray): Readable bitmap of the site
+        conflicts (set[int]): Numbers of the variables with conflicting values, updated in place
+    """
+    if 1 not in readable:
+        return
+    reference_view, view = memoryview(reference), memoryview(values)
+    for start in range(0, len(values), BLOCK):
+        end = min(start + BLOCK, len(values))
+        if view[start:end] == reference_view[start:end] and readable[start:end] == referenced[start:end]:
+            continue
+        if 1 not in referenced[start:end]:
+            reference[start:end] = values[start:end]
+            referenced[start:end] = readable[start:end]
+            continue
+        for k in range(start, end):
+            if not readable[k]:
+                continue
+            if not referenced[k]:
+                reference[k] = values[k]
+                referenced[k] = 1
+            elif values[k] != reference[k]:
+                conflicts.add(numbers[k])
+
+def inconsistent(stores):
+    """
+    Find variables whose readable replicas do not agree on the latest committed value.
+    Only replicated variables can disagree. Sites storing the same replicated variables keep them in the same order, 
+    so each site is compared with a reference of its group block by block (see compare_blocks). The references of groups 
+    storing different variables are then compared by variable number.
+
+    Args:
+        stores (list[ColumnStore]): Column stores of the running sites
+
+    Returns:
+        list[int]: Sorted variable numbers with conflicting values
+    """
+    groups = {}
+    for store in stores:
+        groups.setdefault(store.placement, []).append(store)
+    conflicts = set()
+    references = []
+    for group in groups.values():
+        numbers = group[0].replica_numbers
+        reference, referenced = array('q', group[0].replica_values), bytearray(group[0].replica_readable)
+        for store in group[1:]:
+            compare_blocks(numbers, reference, referenced, store.replica_values, store.replica_readable, conflicts)
+        references.append((numbers, reference, referenced))
+    if len(references) > 1:
+        items = [(list(compress(numbers, referenced)), list(compress(reference, referenced))) 
+                 for numbers, reference, referenced in references]
+        merged = {}
+        for numbers, values in items:
+            merged.update(zip(numbers, values))
+        for numbers, values in items:
+            conflicts.update(compress(numbers, map(ne, values, map(merged.__getitem__, numbers))))
+    return sorted(conflicts)
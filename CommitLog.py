@@ -0,0 +1,260 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from time import perf_counter
+
+# Record: length and CRC32 of the body, then the body
+HEADER = struct.Struct('<II')
+# Body: value kind, length of the variable ID, commit timestamp, then the variable ID and the value
+BODY = struct.Struct('<BHq')
+INT = struct.Struct('<q')
+KIND_INT, KIND_TEXT = 0, 1
+
+class CommitLog(object):
+    """
+    Commit log is the append-only write-ahead log of the commits of one site, kept in a directory of its own.
+    Records are appended to a buffer and copied in batches into fixed-size memory-mapped segment files,
+    which are synced to disk every fsync_interval commits. Every checkpoint_interval commits, the latest committed value
+    of every variable is written to a checkpoint together with the log position it covers, and older segments are deleted,
+    so replay after a restart reads at most one checkpoint interval of records.
+    A commit is durable once its segment is synced; a crash can lose the commits of the last unsynced batch.
+
+    Args:
+        path (str): Directory of the site's log
+        batch (int, optional): Number of buffered bytes copied into the segment at once. Defaults to 64 KiB.
+        fsync_interval (int, optional): Commits between two syncs of the segment. Defaults to 64.
+        checkpoint_interval (int, optional): Commits between two checkpoints. Defaults to 4096.
+        segment_size (int, optional): Size of a segment file in bytes. Defaults to 4 MiB.
+    """
+    CHECKPOINT = 'checkpoint.json'
+
+    def __init__(self, path: str, batch: int=65536, fsync_interval: int=64, checkpoint_interval: int=4096,
+                 segment_size: int=4 << 20):
+        """
+        Constructor for opening the commit log of a site, creating its directory if needed.
+        """
+        self.path = path
+        self.batch = batch
+        self.fsync_interval = fsync_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.segment_size = segment_size
+        self.buffer = bytearray()   # Encoded records not yet copied into the segment
+        self.commits = 0            # Commits since the log was opened
+        self.segment = None         # Index of the open segment
+        self.next = None            # Index of the next segment to create, found on the first append
+        self.map = None             # Memory map of the open segment
+        self.offset = 0             # Write position in the open segment
+        os.makedirs(path, exist_ok=True)
+
+    def segment_path(self, index: int):
+        """
+        Get the file of a segment.
+
+        Args:
+            index (int): Segment index
+
+        Returns:
+            str: Path of the segment file
+        """
+        return os.path.join(self.path, "{:08d}.log".format(index))
+
+    def segments(self):
+        """
+        Get the indexes of the segment files on disk.
+
+        Returns:
+            list[int]: Segment indexes in ascending order
+        """
+        return sorted(int(name[:-4]) for name in os.listdir(self.path) if name.endswith('.log'))
+
+    def next_segment(self):
+        """
+        Get the index of the next segment to create, after every segment on disk and the last checkpoint.
+
+        Returns:
+            int: Segment index
+        """
+        if self.next is None:
+            segments = self.segments()
+            self.next = max(segments[-1] + 1 if segments else 0, self.load_checkpoint()[1])
+        return self.next
+
+    def open_segment(self, size: int=0):
+        """
+        Create the next segment zero-filled and map it for appending.
+
+        Args:
+            size (int, optional): Minimum size of the segment. Defaults to segment_size.
+        """
+        self.close_segment()
+        index = self.next_segment()
+        with open(self.segment_path(index), 'w+b') as f:
+            f.truncate(max(size, self.segment_size))
+            self.map = mmap.mmap(f.fileno(), 0)
+        self.segment = index
+        self.next = index + 1
+        self.offset = 0
+
+    def close_segment(self):
+        """
+        Sync and unmap the open segment.
+        """
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            self.segment = None
+
+    def append(self, v_id: str, val, ts: int):
+        """
+        Append a committed value to the log buffer.
+
+        Args:
+            v_id (str): Variable ID
+            val (int or str): Committed value
+            ts (int): Timestamp of the commit
+        """
+        name = v_id.encode()
+        if isinstance(val, int):
+            body = BODY.pack(KIND_INT, len(name), ts) + name + INT.pack(val)
+        else:
+            body = BODY.pack(KIND_TEXT, len(name), ts) + name + str(val).encode()
+        self.buffer += HEADER.pack(len(body), zlib.crc32(body))
+        self.buffer += body
+
+    def commit(self, n: int=1):
+        """
+        Mark the end of the commits of n transactions at this site.
+
+        Args:
+            n (int, optional): Number of transactions committed together. Defaults to 1.
+
+        Returns:
+            bool: True if a checkpoint is due, False otherwise
+        """
+        before = self.commits
+        self.commits += n
+        if len(self.buffer) >= self.batch:
+            self.flush()
+        if self.commits // self.fsync_interval > before // self.fsync_interval:
+            self.sync()
+        return self.commits // self.checkpoint_interval > before // self.checkpoint_interval
+
+    def flush(self):
+        """
+        Copy the buffered records into the open segment, moving to a new segment when it is full.
+        """
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+        # Keep room for an empty header marking the end of the segment
+        if self.map is None or self.offset + len(data) + HEADER.size > len(self.map):
+            self.open_segment(len(data) + HEADER.size)
+        self.map[self.offset:self.offset + len(data)] = data
+        self.offset += len(data)
+
+    def sync(self):
+        """
+        Copy the buffered records into the segment and sync it to disk.
+        """
+        self.flush()
+        if self.map is not None:
+            self.map.flush()
+
+    def checkpoint(self, values: dict):
+        """
+        Write a checkpoint of the latest committed values and delete the segments it covers.
+        The checkpoint is written to a temporary file and renamed, so a crash leaves either the old or the new one.
+
+        Args:
+            values (dict): Variable ID -> (latest committed value, timestamp)
+        """
+        self.sync()
+        self.close_segment()
+        # Replay starts from a fresh segment after the checkpoint
+        segment = self.next_segment()
+        state = {'segment': segment, 'values': values}
+        tmp = os.path.join(self.path, self.CHECKPOINT + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, self.CHECKPOINT))
+        for index in self.segments():
+            if index < segment:
+                os.remove(self.segment_path(index))
+
+    def load_checkpoint(self):
+        """
+        Read the last checkpoint.
+
+        Returns:
+            tuple: Checkpointed values (variable ID -> [value, timestamp]) and the first segment after the checkpoint,
+                or no values and segment 0 if there is no checkpoint
+        """
+        path = os.path.join(self.path, self.CHECKPOINT)
+        if not os.path.exists(path):
+            return {}, 0
+        with open(path) as f:
+            state = json.load(f)
+        return state['values'], state['segment']
+
+    def replay(self):
+        """
+        Read the last checkpoint and the records appended after it.
+        Reading a segment stops at the first empty or corrupted record.
+
+        Returns:
+            tuple: Checkpointed values (variable ID -> [value, timestamp]), list of (variable ID, value, timestamp)
+                records after the checkpoint, and the statistics of the replay
+        """
+        start = perf_counter()
+        values, segment = self.load_checkpoint()
+        records = []
+        for index in self.segments():
+            if index >= segment:
+                records.extend(read_segment(self.segment_path(index)))
+        stats = {'checkpointed': len(values), 'records': len(records), 'seconds': perf_counter() - start}
+        return values, records, stats
+
+    def close(self):
+        """
+        Sync and close the log.
+        """
+        self.sync()
+        self.close_segment()
+
+def read_segment(path: str):
+    """
+    Decode the records of a segment file.
+
+    Args:
+        path (str): Path of the segment file
+
+    Yields:
+        tuple: Variable ID, value, and timestamp of each record
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            offset = 0
+            while offset + HEADER.size <= len(m):
+                length, crc = HEADER.unpack_from(m, offset)
+                body = m[offset + HEADER.size:offset + HEADER.size + length]
+                if not length or len(body) < length or zlib.crc32(body) != crc:
+                    return
+                kind, size, ts = BODY.unpack_from(body)
+                v_id = body[BODY.size:BODY.size + size].decode()
+                raw = body[BODY.size + size:]
+                val = INT.unpack(raw)[0] if kind == KIND_INT else raw.decode()
+                yield v_id, val, ts
+                offset += HEADER.size + length
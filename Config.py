@@ -4,17 +4,27 @@ Due on Saturday, 12/03/2022
 Author: Wonkwon Lee, Young Il Kim
 
 """
-from enum import Enum
+from enum import Enum, IntEnum
+from collections import namedtuple
+from bisect import bisect, bisect_left, bisect_right
+from itertools import accumulate
+from array import array
+import json
+import zlib
 
 class Transaction(object):
     """
     Transaction object that stores the transaction id, timestamp, and a flag to indicate read-only.
+    A read-write transaction also caches the variables it holds a read or write lock on, with the site and value 
+    its reads return, so repeated reads and reads after writes do not go back to the sites.
 
     Args:
         id (str): Transaction ID
         ts (int): Timestamp of when the transaction began
         is_ro (bool): Whether the transaction is read-only
     """
+    __slots__ = ('id', 'ts', 'is_ro', 'is_aborted', 'visited_sites', 'cache')
+
     def __init__(self, id: str, ts: int, is_ro: bool):
         """
         Constructor to initialize a transaction object.
@@ -24,6 +34,7 @@ class Transaction(object):
         self.is_ro = is_ro          # Flag to indicate whether the transaction is read-only
         self.is_aborted = False     # will abort if deadlock
         self.visited_sites = []     # sites visited by this transaction
+        self.cache = {}             # Locked variable -> (site ID, value) returned by reading it
         
 class Operation(object):
     """
@@ -35,6 +46,8 @@ class Operation(object):
         v_id (int): Variable ID
         val (int): Value to write (if write operation)
     """
+    __slots__ = ('op', 't_id', 'v_id', 'val')
+
     def __init__(self, op: str, t_id: str, v_id: int, val: int=None):
         """
         Constructor to initialize an operation object.
@@ -46,31 +59,221 @@ class Operation(object):
 
 class Variable(object):
     """
-    Variable object that stores the variable id, list of committed values, and flags to indicate readable and replicated
+    Variable object that stores the variable id, list of committed values, and flags to indicate readable and replicated.
+    Committed values are kept in commit timestamp order (oldest first) with a parallel list of timestamps for bisection.
     
     Args:
         v_id (int): Variable ID
-        val (int): Initial value of the variable
+        val (Commit): Initial committed value of the variable
         replicated (bool): Flag to indicate whether the variable is replicated
     """
+    __slots__ = ('v_id', 'val_list', 'ts_list', 'readable', 'replicated', 'fail', 'temp')
+
     def __init__(self, v_id: int, val: int, replicated: bool):
         """
         Constructor to initialize a variable object.
         """
         self.v_id = v_id                # Variable ID
-        self.val_list = [val]           # List of stored committed values
+        self.val_list = [val]           # List of stored committed values, oldest first
+        self.ts_list = [val.ts]         # Commit timestamps of the stored values
         self.readable = True            # Flag to indicate whether the variable is readable
         self.replicated = replicated    # Flag to indicate whether the variable is replicated 
         self.fail = False               # Flag to indicate whether the variable is failed
         self.temp = None          # Temporary value written by a transaction holding W-lock
+
+    def current(self):
+        """
+        Get the latest committed value.
+
+        Returns:
+            Commit: Latest committed value
+        """
+        return self.val_list[-1]
+
+    def add_version(self, commit):
+        """
+        Append a committed value. Commits arrive in timestamp order, so the list stays sorted.
+
+        Args:
+            commit (Commit): Committed value
+        """
+        self.val_list.append(commit)
+        self.ts_list.append(commit.ts)
+
+    def prune(self, horizon: int):
+        """
+        Drop every committed value older than the latest one committed at or before the horizon.
+        No read-only transaction that is active or begins later can read those values.
+
+        Args:
+            horizon (int): Begin timestamp of the oldest active read-only transaction, or the current timestamp
+        """
+        i = bisect_right(self.ts_list, horizon) - 1
+        if i > 0:
+            del self.val_list[:i]
+            del self.ts_list[:i]
+
+    def version_at(self, ts: int):
+        """
+        Find the latest value committed at or before a timestamp.
+
+        Args:
+            ts (int): Timestamp
+
+        Returns:
+            Commit: Latest committed value at the timestamp, or None if there is none
+        """
+        i = bisect_right(self.ts_list, ts)
+        return self.val_list[i - 1] if i else None
     
-class LockType(Enum):
+class VariableTable(dict):
+    """
+    Variable table maps the variable IDs of a site to their variables. A table loaded from a snapshot keeps the 
+    variables in the columns of the snapshot and creates a variable the first time it is looked up, so loading a site 
+    does not build an object per variable and per committed value up front. Iterating the table creates the 
+    variables not looked up yet, in increasing order of their numbers.
+
+    Args:
+        numbers (array): Variable numbers (i for xi) in increasing order
+        replicated (bytes): Replicated flag of each variable
+        readable (bytes): Readable flag of each variable
+        fail (bytes): Failed flag of each variable
+        lengths (array): Number of committed values of each variable
+        vals (array): Committed values of every variable, oldest first
+        ts (array): Commit timestamps of the values
+    """
+    def __init__(self, numbers, replicated, readable, fail, lengths, vals, ts):
+        """
+        Constructor for initializing a table without any created variable.
+        """
+        super().__init__()
+        self.columns = (numbers, replicated, readable, fail, lengths, vals, ts)    # Columns, None once all are created
+        self.offsets = None     # Position of the first value of each variable, computed on first lookup
+
+    def slot(self, v_id):
+        """
+        Find the position of a variable in the columns.
+
+        Args:
+            v_id (str): Variable ID
+
+        Returns:
+            int: Position of the variable, or None if it is not stored at the site
+        """
+        numbers = self.columns[0]
+        try:
+            i = int(v_id[1:])
+        except (TypeError, ValueError):
+            return None
+        k = bisect_left(numbers, i)
+        if k < len(numbers) and numbers[k] == i and v_id == "x" + str(i):
+            return k
+        return None
+
+    def create(self, k: int):
+        """
+        Create the variable at a position of the columns without calling the constructors.
+
+        Args:
+            k (int): Position of the variable
+
+        Returns:
+            Variable: Variable with its committed values
+        """
+        numbers, replicated, readable, fail, lengths, vals, ts = self.columns
+        if self.offsets is None:
+            self.offsets = array('q', accumulate(lengths, initial=0))
+        start, n = self.offsets[k], lengths[k]
+        v = Variable.__new__(Variable)
+        v.v_id, v.replicated, v.readable, v.fail, v.temp = "x" + str(numbers[k]), bool(replicated[k]), \
+            bool(readable[k]), bool(fail[k]), None
+        v.ts_list = ts[start:start + n].tolist()
+        v.val_list = chain = []
+        for val, t in zip(vals[start:start + n].tolist(), v.ts_list):
+            c = Commit.__new__(Commit)
+            c.val, c.ts = val, t
+            chain.append(c)
+        return v
+
+    def load(self):
+        """
+        Create every variable not looked up yet, keeping the variables in increasing order of their numbers.
+        """
+        if self.columns is None:
+            return
+        variables = [dict.get(self, "x" + str(i)) or self.create(k) for k, i in enumerate(self.columns[0])]
+        self.clear()
+        self.update((v.v_id, v) for v in variables)
+        self.columns = self.offsets = None
+
+    def __missing__(self, v_id: str):
+        """
+        Create a variable on first lookup.
+
+        Args:
+            v_id (str): Variable ID
+
+        Returns:
+            Variable: Variable
+        """
+        k = self.slot(v_id) if self.columns is not None else None
+        if k is None:
+            raise KeyError(v_id)
+        v = self[v_id] = self.create(k)
+        return v
+
+    def __contains__(self, v_id):
+        return dict.__contains__(self, v_id) or self.columns is not None and self.slot(v_id) is not None
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns is not None else dict.__len__(self)
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def get(self, v_id, default=None):
+        try:
+            return self[v_id]
+        except KeyError:
+            return default
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+class LockType(IntEnum):
     """
     Enum for lock type.
     """
     READ = 1
     WRITE = 2
 
+# Lock types are stored on locks as plain ints to avoid Enum attribute lookups on the hot path
+READ_LOCK = int(LockType.READ)
+WRITE_LOCK = int(LockType.WRITE)
+
+class SiteLockType(IntEnum):
+    """
+    Enum for site lock type of the lock hierarchy, from the weakest to the strongest.
+    """
+    IS = 1      # Intention shared: the transaction read-locks variables of the site
+    IX = 2      # Intention exclusive: the transaction write-locks variables of the site
+    S = 3       # Shared: the transaction reads the whole site
+    SIX = 4     # Shared and intention exclusive: the transaction reads the whole site and write-locks variables of it
+    X = 5       # Exclusive: the transaction reads and writes the whole site
+
+# Site lock types are stored as plain ints as well
+IS_LOCK, IX_LOCK, S_LOCK, SIX_LOCK, X_LOCK = map(int, SiteLockType)
+
 class TransactionType(Enum):
     """
     Enum for transaction type.
@@ -101,19 +304,182 @@ class AbortType(Enum):
     DEADLOCK = 1
     SITE_FAILURE = 2
     NO_DATA_FOR_READ_ONLY = 3
+    WAIT_DIE = 4        # Younger transaction requested a lock held or requested by an older one
+    WOUND_WAIT = 5      # Older transaction requested a lock held or requested by this younger one
+
+class PolicyType(Enum):
+    """
+    Enum for concurrency policy handling lock conflicts.
+    """
+    DETECTION = 'detection'     # Wait, and abort the youngest transaction of each cycle of the waits-for graph
+    WAIT_DIE = 'wait-die'       # An older requester waits, a younger requester aborts
+    WOUND_WAIT = 'wound-wait'   # An older requester aborts the younger blockers and waits, a younger requester waits
+
+class ReplicaType(Enum):
+    """
+    Enum for replica selection of reads.
+    """
+    FIRST = 'first'                 # First running site in site order
+    ROUND_ROBIN = 'round-robin'     # Readable running sites in turn, per variable
+    LEAST_QUEUED = 'least-queued'   # Readable running site with the shortest lock queue on the variable
+    STICKY = 'sticky'               # Same site for every read of a transaction where possible
+
+class GCMode(Enum):
+    """
+    Enum for multiversion garbage collection mode.
+    """
+    OFF = 'off'         # Keep every committed value
+    COMMIT = 'commit'   # Prune a variable's old values whenever it is committed
+    SWEEP = 'sweep'     # Prune every variable at every site periodically
+
+class EventType(Enum):
+    """
+    Enum for output event type.
+    """
+    COMMAND = 'command'                 # Instruction read from the input
+    BEGIN = 'begin'                     # Transaction began
+    READ = 'read'                       # Read returned a value
+    WRITE = 'write'                     # Write went to the available copies
+    WAIT = 'wait'                       # Write is waiting for a lock
+    COMMIT = 'commit'                   # Transaction committed
+    ABORT = 'abort'                     # Transaction aborted
+    DEADLOCK = 'deadlock'               # Deadlock detected
+    FAIL = 'fail'                       # Site failed
+    RECOVER = 'recover'                 # Site recovered
+    DUMP = 'dump'                       # Committed values of a site
+    NO_TRANSACTION = 'no_transaction'   # Operation for a transaction that is not in the transaction table
+    ERROR = 'error'                     # Any other message
+
+class SinkType(Enum):
+    """
+    Enum for output sink type.
+    """
+    TEXT = 'text'   # Human readable lines
+    JSON = 'json'   # One JSON object per event
+    NONE = 'none'   # Discard every event
 
 class OperationType(Enum):
     """
-    Enum for operation type.
+    Enum for operation type. The value is the method name used in the input.
+    """
+    BEGIN = 'begin'
+    BEGINRO = 'beginRO'
+    WRITE = 'W'
+    READ = 'R'
+    FAIL = 'fail'
+    RECOVER = 'recover'
+    DUMP = 'dump'
+    END = 'end'
+
+class PlacementType(Enum):
+    """
+    Enum for placement of replicated variables.
+    """
+    ALL = 'all'         # Replicated variables are stored at every site
+    MODULO = 'modulo'   # Replicated variable xi is stored at consecutive sites starting from 1 + (i mod sites)
+    HASH = 'hash'       # Replicated variables are placed on a consistent-hash ring of sites
+
+class Topology(object):
+    """
+    Topology object that describes the shape of the database: the number of sites, the number of variables, 
+    and where each variable is stored. Even indexed variables are replicated and odd indexed variables are 
+    stored at one site each (1 + index mod sites). The default is the 10 sites and 20 variables layout.
+
+    Args:
+        sites (int): Number of sites
+        variables (int): Number of variables
+        replication (int): Number of copies of each replicated variable (ignored when placement is ALL)
+        placement (PlacementType): Placement rule of replicated variables
     """
-    BEGIN = 1
-    BEGINRO = 2
-    WRITE = 3
-    READ = 4
-    FAIL = 5
-    RECOVER = 6
-    DUMP = 7
-    END = 8
+    VNODES = 16     # Virtual nodes per site on the consistent-hash ring
+
+    def __init__(self, sites: int=10, variables: int=20, replication: int=None, placement=PlacementType.ALL):
+        """
+        Constructor to initialize a topology object.
+        """
+        placement = PlacementType(placement)
+        if replication is None or placement == PlacementType.ALL:
+            replication = sites
+        if sites < 1 or variables < 0:
+            raise ValueError("Topology needs at least one site")
+        if not 1 <= replication <= sites:
+            raise ValueError("Replication factor must be between 1 and {}".format(sites))
+        self.sites = sites                  # Number of sites
+        self.variables = variables          # Number of variables
+        self.replication = replication      # Number of copies of each replicated variable
+        self.placement = placement          # Placement rule of replicated variables
+        self.ring = None                    # Consistent-hash ring: sorted (hash, site) points
+        if placement == PlacementType.HASH:
+            self.ring = sorted((zlib.crc32("site{}#{}".format(site, n).encode()), site)
+                               for site in range(1, sites + 1) for n in range(self.VNODES))
+
+    @classmethod
+    def load(cls, path: str, **overrides):
+        """
+        Load a topology from a JSON file with the keys sites, variables, replication, and placement.
+
+        Args:
+            path (str): Path of the topology file
+            **overrides: Settings that take precedence over the file
+
+        Returns:
+            Topology: Topology described by the file
+        """
+        with open(path, 'r') as f:
+            settings = json.load(f)
+        settings.update(overrides)
+        return cls(**settings)
+
+    def sites_of(self, i: int):
+        """
+        Find the sites storing a variable.
+
+        Args:
+            i (int): Index of the variable (i for xi)
+
+        Returns:
+            tuple: Sorted site IDs storing the variable
+        """
+        if i % 2:
+            return (i % self.sites + 1,)
+        if self.placement == PlacementType.ALL:
+            return tuple(range(1, self.sites + 1))
+        if self.placement == PlacementType.MODULO:
+            return tuple(sorted((i + k) % self.sites + 1 for k in range(self.replication)))
+        sites = []
+        pos = bisect(self.ring, (zlib.crc32("x{}".format(i).encode()), 0))
+        while len(sites) < self.replication:
+            site = self.ring[pos % len(self.ring)][1]
+            if site not in sites:
+                sites.append(site)
+            pos += 1
+        return tuple(sorted(sites))
+
+    def site_variables(self, site_id: int):
+        """
+        Find the variables stored at a site.
+
+        Args:
+            site_id (int): Site ID
+
+        Returns:
+            list: Indices of the variables stored at the site in increasing order
+        """
+        if self.placement == PlacementType.ALL:
+            evens = range(2, self.variables + 1, 2)
+            odds = range(site_id - 1 if site_id > 1 else self.sites, self.variables + 1, self.sites)
+            return sorted(list(evens) + [i for i in odds if i % 2])
+        return [i for i in range(1, self.variables + 1) if site_id in self.sites_of(i)]
+
+class Instruction(namedtuple('Instruction', ['type', 'args'])):
+    """
+    Instruction tuple produced by the input parser.
+
+    Args:
+        type (OperationType): Operation type
+        args (tuple): Typed arguments (transaction ID, variable ID, integer value or site ID)
+    """
+    __slots__ = ()
 
 class Commit(object):
     """
@@ -123,6 +489,8 @@ class Commit(object):
         val (int): Value to commit
         ts (int): Timestamp of when the commit operation was executed
     """
+    __slots__ = ('val', 'ts')
+
     def __init__(self, val, ts):
         """
         Constructor to initialize a commit object.
@@ -138,6 +506,8 @@ class Output(object):
         succeed (bool): Flag to indicate whether the operation was successful
         val (int): Value of the operation (if write operation)
     """
+    __slots__ = ('succeed', 'val')
+
     def __init__(self, succeed, val=None):
         """
         Constructor to initialize an output object.
@@ -145,6 +515,9 @@ class Output(object):
         self.succeed = succeed
         self.val = val
 
+# Shared result of an operation that did not succeed, so failures do not allocate
+FAILED = Output(False)
+
 class Temp(object):
     """
     Temp object that stores the temporary value and transaction id of the write operation.
@@ -153,6 +526,8 @@ class Temp(object):
         val (int): Temporary value written by a transaction holding the write lock
         t_id (str): Transaction ID of the transaction holding the write lock
     """
+    __slots__ = ('val', 't_id')
+
     def __init__(self, val, t_id):
         """
         Constructor to initialize a temp object.
@@ -168,13 +543,15 @@ class RLock(object):
         t_id (int): Transaction ID
         v_id (int): Variable ID
     """
+    __slots__ = ('t_table', 'v_id', 'type')
+
     def __init__(self, t_id: int, v_id: int):
         """
         Constructor to initialize a read lock object.
         """
         self.t_table = {t_id}
         self.v_id = v_id
-        self.type = LockType.READ
+        self.type = READ_LOCK
 
 class WLock(object):
     """
@@ -184,13 +561,15 @@ class WLock(object):
         t_id (int): Transaction ID
         v_id (int): Variable ID
     """
+    __slots__ = ('t_id', 'v_id', 'type')
+
     def __init__(self, t_id: int, v_id: int):
         """
         Constructor to initialize a write lock object.
         """
         self.t_id = t_id
         self.v_id = v_id
-        self.type = LockType.WRITE
+        self.type = WRITE_LOCK
 
 class QLock(object):
     """
@@ -201,11 +580,13 @@ class QLock(object):
         v_id (int): Variable ID
         lock_type (LockType): Lock type (READ/WRITE)
     """
+    __slots__ = ('t_id', 'v_id', 'type')
+
     def __init__(self, t_id: int, v_id: int, lock_type: LockType):
         """
         Constructor to initialize a lock queue object.
         """
         self.t_id = t_id
         self.v_id = v_id
-        self.type = lock_type 
+        self.type = int(lock_type)
         
\ No newline at end of file
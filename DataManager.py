@@ -4,8 +4,14 @@ Due on Saturday, 12/03/2022
 Author: Wonkwon Lee, Young Il Kim
 """
 from Config import *
-from LockManager import LockManager
+from bisect import bisect_right
+from LockManager import LockTable, SiteLock
+from ColumnStore import ColumnStore
+from array import array
+from EventSink import EventSink
 from collections import defaultdict
+from functools import partial
+from time import perf_counter
 
 class DataManager(object):
     """
@@ -14,28 +20,128 @@ class DataManager(object):
     
     Args:
         site_id (int): Site ID
+        graph (WaitsForGraph, optional): Waits-for graph notified when a lock manager changes
+        waiters (WaiterIndex, optional): Waiter index notified when a lock manager changes or a variable is committed
+        topology (Topology, optional): Shape of the database. Defaults to 10 sites and 20 variables.
+        columnar (bool, optional): Whether to mirror the latest committed state in a column store
+        out (EventSink, optional): Event sink receiving the output of the site
+        prevent (callable, optional): Deadlock prevention check called with the requesting transaction ID and
+            the transaction IDs it would wait for, returning False if the requester must abort instead of waiting
+        log (CommitLog, optional): Write-ahead log receiving the committed values of the site
+        escalation (int, optional): Number of variables a transaction touches at the site before its variable locks 
+            are escalated to a site lock. Defaults to None, keeping variable locks only.
         
     Returns:
-        DataManager: A data manager object one for each site. Even variables are replicated at all sites and odd variables are not replicated.
+        DataManager: A data manager object one for each site. Even variables are replicated and odd variables are not replicated.
     """
-    def __init__(self, site_id: str):
+    def __init__(self, site_id: str, graph=None, waiters=None, topology=None, columnar=False, out=None, prevent=None,
+                 log=None, escalation=None):
         self.site_id = site_id      # Site ID
+        self.prevent = prevent      # Deadlock prevention check, None for deadlock detection
+        self.out = out or EventSink()   # Event sink
+        self.graph = graph          # Waits-for graph maintained by the transaction manager
+        self.waiters = waiters      # Index of blocked operations maintained by the transaction manager
         self.is_running = True      # Flag to indicate if the site is running
         self.data_table = {}        # Dictionary of variables stored at this site
-        self.lock_table = {}        # Dictionary of lock managers for each variable
+        self.lock_table = LockTable(self.data_table, self.out)     # Lock managers of the variables, created on first use
         self.fail_ts = []           # List of timestamps when the site failed
         self.recover_ts = []        # List of timestamps when the site recovered
         self.readable = set()       # Set of variables that are readable at this site
+        self.footprint = defaultdict(dict)  # Variables each transaction locked, queued on, or wrote at this site
+        self.deferred = None        # Notifications recorded while the site runs in a worker of the site executor
+        self.log = log              # Write-ahead log of the committed values, None if commits are not logged
+        self.escalation = escalation    # Variables a transaction touches before lock escalation, None for no escalation
+        self.site_lock = SiteLock() if escalation else None     # Site level of the lock hierarchy
 
         # Initialize data variables
-        for i in range(1, 21):
-            v_id = "x" + str(i)    # Variable ID: x1, x2, ..., x20
-            if i % 2 == 0:                      # Even variables are replicated
-                self.data_table[v_id] = Variable(v_id, Commit(i*10,0), True)
-                self.lock_table[v_id] = LockManager(v_id)
-            elif i % 10 + 1 == self.site_id:    # Odd variables are not replicated
-                self.data_table[v_id] = Variable(v_id, Commit(i*10,0), False)
-                self.lock_table[v_id] = LockManager(v_id)
+        topology = topology or Topology()
+        for i in topology.site_variables(self.site_id):
+            v_id = "x" + str(i)    # Variable ID: x1, x2, ..., xn
+            replicated = len(topology.sites_of(i)) > 1
+            self.data_table[v_id] = Variable(v_id, Commit(i*10,0), replicated)
+        self.store = ColumnStore(self.data_table) if columnar else None     # Column store of the latest committed state
+
+    def __getstate__(self):
+        """
+        Get the state to snapshot, without the event sink, the write-ahead log, and recorded notifications.
+        Variables are stored column by column: variable numbers, flags, and version chains flattened into one array of 
+        values and one array of timestamps. Only lock managers holding or queueing a lock are kept.
+
+        Returns:
+            dict: Attributes of the data manager
+        """
+        state = self.__dict__.copy()
+        state['out'] = state['log'] = state['deferred'] = None
+        # Methods timed by the profiler are instance attributes shadowing the methods of the class
+        for k in [k for k in state if callable(getattr(type(self), k, None))]:
+            del state[k]
+        variables = list(self.data_table.values())
+        state['data_table'] = (
+            array('l', [int(k[1:]) for k in self.data_table]),
+            bytes(v.replicated for v in variables),
+            bytes(v.readable for v in variables),
+            bytes(v.fail for v in variables),
+            array('l', [len(v.val_list) for v in variables]),
+            array('q', [c.val for v in variables for c in v.val_list]),
+            array('q', [ts for v in variables for ts in v.ts_list]),
+            {v.v_id: (v.temp.val, v.temp.t_id) for v in variables if v.temp},
+        )
+        state['lock_table'] = {k: lm for k, lm in self.lock_table.items() if lm.lock or lm.lock_queue}
+        return state
+
+    def __setstate__(self, state: dict):
+        """
+        Restore the state from a snapshot. Variables stay in the columns of the snapshot and are created without calling 
+        their constructors the first time they are looked up.
+
+        Args:
+            state (dict): Attributes of the data manager
+        """
+        *columns, temps = state.pop('data_table')
+        lock_table = state.pop('lock_table')
+        self.__dict__.update(state)
+        self.data_table = data_table = VariableTable(*columns)
+        for v_id, (val, t_id) in temps.items():
+            temp = Temp.__new__(Temp)
+            temp.val, temp.t_id = val, t_id
+            data_table[v_id].temp = temp
+        self.lock_table = LockTable(data_table)
+        self.lock_table.update(lock_table)
+
+    def attach(self, out):
+        """
+        Attach an event sink to the site and its lock managers after loading a snapshot.
+
+        Args:
+            out (EventSink): Event sink receiving the output of the site
+        """
+        self.out = out
+        self.lock_table.out = out
+        for lm in self.lock_table.values():
+            lm.out = out
+
+    def touch(self, v_id: str):
+        """
+        Notify the waits-for graph and the blocked operations that the lock or the lock queue of a variable has changed.
+
+        Args:
+            v_id (str): Variable ID
+        """
+        if self.deferred is not None:
+            self.deferred.append(partial(self.touch, v_id))
+            return
+        if self.graph:
+            self.graph.mark(self, v_id)
+        if self.waiters:
+            self.waiters.wake_lock(self.site_id, v_id)
+
+    def replay(self):
+        """
+        Apply the notifications recorded while the site ran in a worker, in the order they were recorded.
+        """
+        deferred, self.deferred = self.deferred, None
+        for notify in deferred or ():
+            notify()
                    
     def read_snapshot(self, v_id: int, ts:int):
         """
@@ -46,20 +152,22 @@ class DataManager(object):
             ts (int): Timestamp of the snapshot
             
         Returns:
-            Output: An output object containing the result of the read_snapshot operation.
+            Output: An output object containing the result of the read_snapshot operation, 
+            or None if no value was committed before the snapshot.
         """
         var = self.data_table[v_id]
         
         if not var.readable:
-            return Output(False)
-        else:
-            for cv in var.val_list:
-                if cv.ts <= ts:
-                    if var.replicated:
-                        for f in self.fail_ts:
-                            if cv.ts < f and f <= ts:
-                                return Output(False)
-                    return Output(True, cv.val)
+            return FAILED
+        cv = var.version_at(ts)
+        if cv is None:
+            return None
+        if var.replicated:
+            # The site must have stayed up between the commit and the snapshot
+            i = bisect_right(self.fail_ts, cv.ts)
+            if i < len(self.fail_ts) and self.fail_ts[i] <= ts:
+                return FAILED
+        return Output(True, cv.val)
         
     def read(self, t_id: int, v_id: int):
         """
@@ -74,30 +182,36 @@ class DataManager(object):
         """
         var = self.data_table[v_id]
         if var.readable:
+            self.footprint[t_id][v_id] = True
+            if self.site_lock and self.intend(t_id, v_id, IS_LOCK):
+                return Output(True, var.temp.val if var.temp and var.temp.t_id == t_id else var.current().val)
             lm = self.lock_table[v_id]
             lock = lm.lock
             
             if lock:
-                if lock.type == LockType.READ:
+                if lock.type == READ_LOCK:
                     if t_id in lock.t_table:
-                        return Output(True, var.val_list[0].val)
+                        return Output(True, var.current().val)
                     if not lm.check_wlock():
                         lm.share_lock(t_id)
-                        return Output(True, var.val_list[0].val)
-                    lm.add_queue(QLock(t_id, v_id, LockType.READ))
-                    return Output(False, None)
+                        self.touch(v_id)
+                        return Output(True, var.current().val)
+                    self.enqueue(lm, t_id, v_id, READ_LOCK)
+                    return FAILED
                 
-                elif lock.type == LockType.WRITE:
+                elif lock.type == WRITE_LOCK:
                     if t_id == lock.t_id:
-                        return Output(True, var.tempVal)
-                    lm.add_queue(QLock(t_id, v_id, LockType.READ))
-                    return Output(False, None)
+                        # The write lock may be handed over from the queue before the write itself runs
+                        return Output(True, var.temp.val if var.temp else var.current().val)
+                    self.enqueue(lm, t_id, v_id, READ_LOCK)
+                    return FAILED
                 else:
-                    print("Invalid lock type")
-                    return Output(False, None)
+                    self.out.emit(EventType.ERROR, message="Invalid lock type")
+                    return FAILED
             lm.lock = RLock(t_id, v_id)
-            return Output(True, var.val_list[0].val)
-        return Output(False, None)
+            self.touch(v_id)
+            return Output(True, var.current().val)
+        return FAILED
         
     def write(self, t_id: int, v_id: int, val: int):
         """
@@ -108,7 +222,12 @@ class DataManager(object):
             v_id (int): Variable ID
             val (int): Value to write
         """
+        self.footprint[t_id][v_id] = True
         var = self.data_table[v_id]
+        if self.site_lock and self.covered(t_id, v_id, IX_LOCK):
+            self.site_lock.escalated[t_id][v_id] = WRITE_LOCK
+            var.temp = Temp(val, t_id)
+            return
         lm = self.lock_table[v_id]
         lock = lm.lock
         # print("================ DM :: def write() ================")
@@ -116,25 +235,27 @@ class DataManager(object):
         # print("var :: {}".format(var))
         # print("lock :: {}".format(lock))
         if lock:
-            if lock.type == LockType.READ: 
+            if lock.type == READ_LOCK: 
                 if len(lock.t_table) != 1:
-                    print("Write lock cannot be acquired. Need to wait.")
+                    self.out.emit(EventType.ERROR, message="Write lock cannot be acquired. Need to wait.")
                     return
                 if t_id in lock.t_table:
                     if lm.check_wlock(t_id):
-                        print("Write lock cannot be acquired. Need to wait.")
+                        self.out.emit(EventType.ERROR, message="Write lock cannot be acquired. Need to wait.")
                         return
                     lm.process_lock(WLock(t_id, v_id))
+                    self.touch(v_id)
                     var.temp = Temp(val, t_id)
                     return
-                print("Write lock cannot be acquired. Need to wait.")
+                self.out.emit(EventType.ERROR, message="Write lock cannot be acquired. Need to wait.")
                 return
             if t_id == lock.t_id:
                 var.temp = Temp(val, t_id)
                 return
-            print("Write lock cannot be acquired. Need to wait.")
+            self.out.emit(EventType.ERROR, message="Write lock cannot be acquired. Need to wait.")
             return
         lm.lock = WLock(t_id, v_id)
+        self.touch(v_id)
         var.temp = Temp(val, t_id)
         return
 
@@ -147,9 +268,13 @@ class DataManager(object):
         """
         self.is_running = False
         self.fail_ts.append(ts)
+        if self.graph:
+            self.graph.drop_site(self.site_id)
         for k, v in self.lock_table.items():
             v.lock = None
-            v.lock_queue = []
+            v.lock_queue.clear()
+        if self.site_lock:
+            self.site_lock.clear()
 
     def recover(self, ts: int):
         """
@@ -163,54 +288,148 @@ class DataManager(object):
         for k, v in self.data_table.items():
             if v.replicated:
                 v.readable = False
+        if self.store:
+            self.store.recover()
                 
+    def restore(self):
+        """
+        Restore the committed values of the site from its write-ahead log after a restart:
+        the values of the last checkpoint, then every commit logged after it.
+
+        Returns:
+            dict: Number of checkpointed values and replayed records, seconds spent, and the latest commit timestamp
+        """
+        start = perf_counter()
+        values, records, stats = self.log.replay()
+        latest = 0
+        for k, (val, ts) in values.items():
+            v = self.data_table.get(k)
+            if v:
+                v.val_list, v.ts_list = [Commit(val, ts)], [ts]
+                latest = max(latest, ts)
+        for k, val, ts in records:
+            v = self.data_table.get(k)
+            # Records older than the checkpointed value were written before the checkpoint
+            if v and ts > v.ts_list[-1]:
+                v.add_version(Commit(val, ts))
+                latest = max(latest, ts)
+        if self.store:
+            self.store = ColumnStore(self.data_table)
+        stats['seconds'] = perf_counter() - start
+        stats['ts'] = latest
+        return stats
+
+    def collect_versions(self, horizon: int):
+        """
+        Drop old committed values of every variable at this site that no read-only transaction can read any more.
+
+        Args:
+            horizon (int): Begin timestamp of the oldest active read-only transaction, or the current timestamp
+        """
+        for v in self.data_table.values():
+            v.prune(horizon)
+
     def dump(self):
         """
-        Dump all variables at this site and print them out.
+        Dump all variables at this site to the event sink.
         """
         status = "running" if self.is_running else "failed"
-        output = f"Site {self.site_id} - {status}"
-
-        for k, v in self.data_table.items():
-            output += " {} : {}".format(k, v.val_list[0].val)
-        print(output)
+        if self.store:
+            variables = self.store.variables()
+        else:
+            variables = {k: v.current().val for k, v in self.data_table.items()}
+        if self.deferred is not None:
+            self.deferred.append(partial(self.out.emit, EventType.DUMP, site=self.site_id, status=status, 
+                                         variables=variables))
+            return
+        self.out.emit(EventType.DUMP, site=self.site_id, status=status, variables=variables)
 
     def abort(self, t_id: int):
         """
         Abort all variables that are written by the transaction.
+        Only the variables in the transaction's footprint at this site are visited.
 
         Args:
             t_id (int): Transaction ID
         """
-        for k, v in self.lock_table.items():
-            v.release_lock(t_id)
-            for ql in list(v.lock_queue):
-                if ql.t_id == t_id:
-                    v.lock_queue.remove(ql)
-        self.release_all_lock()                
+        footprint = self.footprint.pop(t_id, {})
+        if self.site_lock:
+            self.site_lock.release(t_id)
+        for k in footprint:
+            # Variables used under a site lock may have no lock manager
+            v = self.lock_table.get(k)
+            if not v:
+                continue
+            if v.release_lock(t_id):
+                self.touch(k)
+            if v.lock_queue.remove_transaction(t_id):
+                self.touch(k)
+        self.release_all_lock(footprint)
                            
-    def commit(self, t_id: int, ts: int):
+    def commit(self, t_id: int, ts: int, horizon: int=None):
         """
         Commit all variables that are written by the transaction.
+        Only the variables in the transaction's footprint at this site are visited.
 
         Args:
             t_id (int): Transaction ID
             ts (int): Timestamp of the commit
+            horizon (int, optional): If provided, old values of the committed variables that no read-only 
+                transaction can read any more are dropped
         """
-        for k, v in self.lock_table.items():
-            v.release_lock(t_id)
-            for ql in list(v.lock_queue):
-                # print("ql.t_id {}".format(ql.t_id))
-                # print("t_id {}".format(t_id))
-                if ql.t_id == t_id:
+        self.commit_group([(t_id, ts)], horizon)
+
+    def commit_group(self, group: list, horizon: int=None):
+        """
+        Commit several transactions in one pass, in the given order: release their locks, append their committed values,
+        hand off the released locks once, and count them in the write-ahead log at once.
+        A variable is written by at most one transaction of the group, since each writer holds its write lock until the group commits.
+
+        Args:
+            group (list): (transaction ID, timestamp of the commit) pairs in commit order
+            horizon (int, optional): If provided, old values of the committed variables that no read-only 
+                transaction can read any more are dropped
+        """
+        footprints = [(t_id, ts, self.footprint.pop(t_id, {})) for t_id, ts in group]
+        released = {}       # Variables whose locks may have been released, in order
+        for t_id, ts, footprint in footprints:
+            if self.site_lock:
+                self.site_lock.release(t_id)
+            for k in footprint:
+                released[k] = True
+                # Variables used under a site lock may have no lock manager
+                v = self.lock_table.get(k)
+                if not v:
                     continue
-        for k, v in self.data_table.items():
-            if v.temp and v.temp.t_id == t_id:
-                v.val_list.insert(0, Commit(v.temp.val, ts))
-                v.readable = True
-                # print("v.temp {}".format(v.temp.value))
-                # print("v's commits {}".format(v.commits[0].val))
-        self.release_all_lock()
+                if v.release_lock(t_id):
+                    self.touch(k)
+                # A transaction may end while one of its operations is still queued
+                if v.lock_queue.remove_transaction(t_id):
+                    self.touch(k)
+        written = 0         # Number of transactions of the group that committed a value at this site
+        for t_id, ts, footprint in footprints:
+            wrote = False
+            for k in footprint:
+                v = self.data_table[k]
+                if v.temp and v.temp.t_id == t_id:
+                    wrote = True
+                    v.add_version(Commit(v.temp.val, ts))
+                    if self.log:
+                        self.log.append(k, v.temp.val, ts)
+                    if horizon is not None:
+                        v.prune(horizon)
+                    v.readable = True
+                    if self.store:
+                        self.store.commit(k, v.temp.val, ts)
+                    if self.waiters:
+                        if self.deferred is not None:
+                            self.deferred.append(partial(self.waiters.wake_variable, k))
+                        else:
+                            self.waiters.wake_variable(k)
+            written += wrote
+        self.release_all_lock(released)
+        if self.log and written and self.log.commit(written):
+            self.log.checkpoint({k: [v.current().val, v.current().ts] for k, v in self.data_table.items()})
     
     def acquire_wlock(self, t_id: int, v_id: int):
         """
@@ -222,53 +441,195 @@ class DataManager(object):
         Returns:
             bool: True if the lock is acquired, False otherwise.
         """
+        self.footprint[t_id][v_id] = True
+        if self.site_lock and self.intend(t_id, v_id, IX_LOCK):
+            return True
         lm = self.lock_table[v_id]
         lock = lm.lock
         if lock:
-            if lock.type == LockType.READ:
+            if lock.type == READ_LOCK:
                 if len(lock.t_table) != 1:
-                    lm.add_queue(QLock(t_id, v_id, LockType.WRITE))
+                    self.enqueue(lm, t_id, v_id, WRITE_LOCK)
                     return False
                 # print("lock.t_table :: {}".format(lock.t_table))
                 if t_id in lock.t_table:
                     if lm.check_wlock(t_id):
-                        lm.add_queue(QLock(t_id, v_id, LockType.WRITE))
+                        self.enqueue(lm, t_id, v_id, WRITE_LOCK)
                         return False
                     return True
-                lm.add_queue(QLock(t_id, v_id, LockType.WRITE))
+                self.enqueue(lm, t_id, v_id, WRITE_LOCK)
                 return False
             if t_id == lock.t_id:
                 return True
-            lm.add_queue(QLock(t_id, v_id,LockType.WRITE))
+            self.enqueue(lm, t_id, v_id, WRITE_LOCK)
             return False
         return True
 
-    def init_block_graph(self):
+    def intend(self, t_id: int, v_id: str, mode: int):
         """
-        Initialize the block graph for the site.
+        Take the intention lock of an access on the site, and escalate the locks of the transaction to a site lock
+        once it has touched escalation variables of the site. Variable locks that other escalated transactions 
+        would hold on the variable are created first, so the access waits for them like for any other lock.
+
+        Args:
+            t_id (int): Transaction ID
+            v_id (str): Variable ID
+            mode (int): Intention lock type, IS_LOCK to read or IX_LOCK to write
 
         Returns:
-            graph (dict): Block graph for the site.
+            bool: True if the site lock of the transaction covers the access and no variable lock is needed, 
+                False otherwise.
         """
-        graph = defaultdict(set)
-        for k, v in self.lock_table.items():
-            if not v.lock or not v.lock_queue:
+        site_lock = self.site_lock
+        site_lock.hold(t_id, mode)
+        if t_id not in site_lock.escalated and len(self.footprint[t_id]) >= self.escalation:
+            if site_lock.escalate(t_id):
+                self.trade(t_id)
+        if not site_lock.escalated:
+            return False
+        self.materialize(t_id, v_id)
+        if not self.covered(t_id, v_id, mode):
+            return False
+        # A write is recorded as covered once it is written
+        if mode == IS_LOCK:
+            site_lock.escalated[t_id].setdefault(v_id, READ_LOCK)
+        return True
+
+    def covered(self, t_id: int, v_id: str, mode: int):
+        """
+        Check if the site lock of a transaction covers an access: it holds X, or S or SIX to read, 
+        and no transaction holds or queues a lock on the variable.
+
+        Args:
+            t_id (int): Transaction ID
+            v_id (str): Variable ID
+            mode (int): Intention lock type of the access
+
+        Returns:
+            bool: True if the access needs no variable lock, False otherwise.
+        """
+        held = self.site_lock.modes.get(t_id)
+        if held == X_LOCK or held and held >= S_LOCK and mode == IS_LOCK:
+            lm = self.lock_table.get(v_id)
+            return not lm or not lm.lock and not lm.lock_queue
+        return False
+
+    def trade(self, t_id: int):
+        """
+        Drop the variable locks that the new site lock of a transaction covers: the locks it holds alone 
+        with nobody queued, keeping write locks under an S lock.
+
+        Args:
+            t_id (int): Transaction ID
+        """
+        exclusive = self.site_lock.modes[t_id] == X_LOCK
+        scope = self.site_lock.escalated[t_id]
+        for k in self.footprint[t_id]:
+            lm = self.lock_table.get(k)
+            if not lm or lm.lock_queue or not lm.lock:
                 continue
-            for l in v.lock_queue:
-                if self.check_qlock(v.lock, l):
-                    if v.lock.type == LockType.READ:
-                        for t_id in v.lock.t_table:
-                            if t_id != l.t_id:
-                                graph[l.t_id].add(t_id)
-                    else:
-                        if v.lock.t_id != l.t_id:
-                            graph[l.t_id].add(
-                                v.lock.t_id)
-            for i in range(len(v.lock_queue)):
-                for j in range(i):
-                    if self.check_queue(v.lock_queue[j], v.lock_queue[i]):
-                        graph[v.lock_queue[i].t_id].add(v.lock_queue[j].t_id)
-        return graph
+            lock = lm.lock
+            if lock.type == WRITE_LOCK and exclusive and lock.t_id == t_id or \
+                    lock.type == READ_LOCK and lock.t_table == {t_id}:
+                del self.lock_table[k]
+                scope[k] = lock.type
+
+    def materialize(self, t_id: int, v_id: str):
+        """
+        Give the escalated transactions that used a variable under their site lock the variable lock they would hold, 
+        before another transaction accesses the variable: a write lock if the transaction wrote the variable under it, 
+        a read lock otherwise.
+
+        Args:
+            t_id (int): Transaction ID of the accessing transaction
+            v_id (str): Variable ID
+        """
+        lm = self.lock_table.get(v_id)
+        # Once a variable is locked, accesses under a site lock take variable locks as well
+        if lm and (lm.lock or lm.lock_queue):
+            return
+        for h, scope in self.site_lock.escalated.items():
+            if h == t_id or v_id not in scope:
+                continue
+            lm = self.lock_table[v_id]
+            if scope.pop(v_id) == WRITE_LOCK:
+                lm.lock = WLock(h, v_id)
+            elif lm.lock:
+                lm.share_lock(h)
+            else:
+                lm.lock = RLock(h, v_id)
+            self.touch(v_id)
+
+    def enqueue(self, lm, t_id: int, v_id: str, lock_type: int):
+        """
+        Add a lock request to the queue of a variable, unless the deadlock prevention check decides that
+        the requesting transaction aborts instead of waiting.
+
+        Args:
+            lm (LockManager): Lock manager of the variable
+            t_id (int): Transaction ID
+            v_id (str): Variable ID
+            lock_type (int): Requested lock type
+        """
+        if self.prevent and not self.prevent(t_id, self.blockers(lm, t_id, lock_type)):
+            return
+        lm.add_queue(QLock(t_id, v_id, lock_type))
+        self.touch(v_id)
+
+    def blockers(self, lm, t_id: int, lock_type: int):
+        """
+        Find the transactions a lock request would wait for: the conflicting holders of the current lock and 
+        every conflicting lock already in the queue.
+
+        Args:
+            lm (LockManager): Lock manager of the variable
+            t_id (int): Transaction ID
+            lock_type (int): Requested lock type
+
+        Returns:
+            set: Transaction IDs blocking the request
+        """
+        lock = lm.lock
+        blockers = set()
+        if lock.type == WRITE_LOCK:
+            blockers.add(lock.t_id)
+        elif lock_type == WRITE_LOCK:
+            blockers.update(lock.t_table)
+        for l in lm.lock_queue:
+            if l.type == WRITE_LOCK or lock_type == WRITE_LOCK:
+                blockers.add(l.t_id)
+        blockers.discard(t_id)
+        return blockers
+
+    def block_edges(self, v_id: str):
+        """
+        Compute the waits-for edges produced by the lock manager of a variable.
+
+        Args:
+            v_id (str): Variable ID
+
+        Returns:
+            edges (set): Set of (waiting transaction ID, blocking transaction ID) pairs.
+        """
+        edges = set()
+        v = self.lock_table.get(v_id)
+        if not v or not v.lock or not v.lock_queue:
+            return edges
+        queue = list(v.lock_queue)
+        for l in queue:
+            if self.check_qlock(v.lock, l):
+                if v.lock.type == READ_LOCK:
+                    for t_id in v.lock.t_table:
+                        if t_id != l.t_id:
+                            edges.add((l.t_id, t_id))
+                else:
+                    if v.lock.t_id != l.t_id:
+                        edges.add((l.t_id, v.lock.t_id))
+        for i in range(len(queue)):
+            for j in range(i):
+                if self.check_queue(queue[j], queue[i]):
+                    edges.add((queue[i].t_id, queue[j].t_id))
+        return edges
 
     def check_qlock(self, lock, qlock):
         """
@@ -281,8 +642,8 @@ class DataManager(object):
         Returns:
             bool: True if the current lock is blocking the queued lock, False otherwise.
         """
-        if lock.type == LockType.READ:
-            if qlock.type == LockType.READ or len(lock.t_table) == 1 and qlock.t_id in lock.t_table:
+        if lock.type == READ_LOCK:
+            if qlock.type == READ_LOCK or len(lock.t_table) == 1 and qlock.t_id in lock.t_table:
                     return False
             return True
         return not lock.t_id == qlock.t_id
@@ -299,28 +660,34 @@ class DataManager(object):
             bool: True if the head queued lock is blocking the tail queued lock, False otherwise.
         """
         
-        if head.type == LockType.READ and tail.type == LockType.READ:
+        if head.type == READ_LOCK and tail.type == READ_LOCK:
             return False
         return not head.t_id == tail.t_id
 
-    def release_all_lock(self):
+    def release_all_lock(self, v_ids):
         """
-        Release all locks on the site.
+        Hand off released locks to the transactions waiting in the lock queues of the given variables.
+
+        Args:
+            v_ids (iterable): Variable IDs whose locks may have been released
         """
-        for k, v in self.lock_table.items():
-            if v.lock_queue:
+        for k in v_ids:
+            v = self.lock_table.get(k)
+            if v and v.lock_queue:
+                self.touch(k)
                 if not v.lock:
-                    lock = v.lock_queue.pop(0)
-                    if lock.type == LockType.WRITE:
+                    lock = v.lock_queue.popleft()
+                    if lock.type == WRITE_LOCK:
                         v.lock = WLock(lock.t_id, lock.v_id)
                     else:
                         v.lock = RLock(lock.t_id, lock.v_id)
-                if v.lock.type == LockType.READ:
-                    for l in list(v.lock_queue):
-                        if l.type == LockType.WRITE:
+                if v.lock.type == READ_LOCK:
+                    while v.lock_queue:
+                        l = v.lock_queue.head()
+                        if l.type == WRITE_LOCK:
                             if len(v.lock.t_table) == 1 and l.t_id in v.lock.t_table:
                                 v.process_lock(WLock(l.t_id, l.v_id))
-                                v.lock_queue.remove(l)
+                                v.lock_queue.popleft()
                             break
                         v.share_lock(l.t_id)
-                        v.lock_queue.remove(l)
+                        v.lock_queue.popleft()
@@ -0,0 +1,205 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import json
+import sys
+from Config import *
+
+class EventSink(object):
+    """
+    Event sink receives typed events from the transaction manager, data managers, and lock managers.
+    The base sink discards every event, which is used for benchmarking.
+    """
+    def emit(self, event: EventType, **fields):
+        """
+        Receive an event.
+
+        Args:
+            event (EventType): Event type
+            **fields: Fields of the event
+        """
+        pass
+
+    def flush(self):
+        """
+        Write out buffered events.
+        """
+        pass
+
+class CountingSink(EventSink):
+    """
+    Counting sink counts events by type and abort reason without formatting them, which is used for benchmarking.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing a counting sink.
+        """
+        self.counts = dict.fromkeys(EventType, 0)
+        self.aborts = {}
+
+    def emit(self, event: EventType, **fields):
+        """
+        Count an event.
+
+        Args:
+            event (EventType): Event type
+            **fields: Fields of the event
+        """
+        self.counts[event] += 1
+        if event == EventType.ABORT:
+            reason = fields['reason']
+            self.aborts[reason] = self.aborts.get(reason, 0) + 1
+
+class BufferedSink(EventSink):
+    """
+    Buffered sink formats events into lines and writes them to a stream in batches.
+
+    Args:
+        stream (file, optional): Output stream. Defaults to standard output.
+        batch (int, optional): Number of events buffered before they are written. Defaults to 1.
+    """
+    def __init__(self, stream=None, batch: int=1):
+        """
+        Constructor for initializing a buffered sink.
+        """
+        self.stream = stream or sys.stdout
+        self.batch = batch
+        self.buffer = []
+
+    def emit(self, event: EventType, **fields):
+        """
+        Format an event and write out the buffer once it holds a full batch.
+
+        Args:
+            event (EventType): Event type
+            **fields: Fields of the event
+        """
+        self.buffer.append(self.format(event, fields))
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def format(self, event: EventType, fields: dict):
+        """
+        Format an event.
+
+        Args:
+            event (EventType): Event type
+            fields (dict): Fields of the event
+
+        Returns:
+            str: Formatted event including the trailing new line
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Write out buffered events.
+        """
+        if self.buffer:
+            self.stream.write("".join(self.buffer))
+            self.buffer = []
+        self.stream.flush()
+
+class TextSink(BufferedSink):
+    """
+    Text sink writes events as the human readable lines of the original output.
+    """
+    TEMPLATES = {
+        EventType.READ: "Transaction {t_id} reads variable {v_id} of {val} on site {site} at time stamp {ts} \n\n",
+        EventType.WRITE: "Transaction {t_id} writes variable {v_id} with value {val} to sites {sites} at time stamp {ts}. \n\n",
+        EventType.WAIT: "Write lock conflict found. Transaction {t_id} is waiting. \n\n",
+        EventType.COMMIT: "Transaction {t_id} commits at time stamp {ts} \n\n",
+        EventType.DEADLOCK: "Deadlock detected. Abort transaction {t_id}\n",
+        EventType.FAIL: "Site {site} fails \n\n",
+        EventType.RECOVER: "Site {site} recovers at time stamp {ts} \n\n",
+        EventType.NO_TRANSACTION: "Transaction table does not contains {t_id} \n\n",
+        EventType.ERROR: "{message}\n",
+    }
+    ABORTS = {
+        AbortType.DEADLOCK: "Transaction {t_id} aborts due to deadlock at time stamp {ts}  \n\n",
+        AbortType.SITE_FAILURE: "Transaction {t_id} aborts due to site failure at time stamp {ts}  \n\n",
+        AbortType.WAIT_DIE: "Transaction {t_id} aborts due to wait-die at time stamp {ts}  \n\n",
+        AbortType.WOUND_WAIT: "Transaction {t_id} aborts due to wound-wait at time stamp {ts}  \n\n",
+        None: "Transaction {t_id} aborts \n\n",
+    }
+
+    def format(self, event: EventType, fields: dict):
+        """
+        Format an event as a line of text.
+
+        Args:
+            event (EventType): Event type
+            fields (dict): Fields of the event
+
+        Returns:
+            str: Formatted event including the trailing new line
+        """
+        if event in self.TEMPLATES:
+            return self.TEMPLATES[event].format(**fields)
+        if event == EventType.COMMAND:
+            return " ".join([fields['method']] + [str(a) for a in fields['args']]) + "\n"
+        if event == EventType.BEGIN:
+            kind = "Read-only transaction" if fields['ro'] else "Transaction"
+            return "{} {} begins at time stamp {} \n\n".format(kind, fields['t_id'], fields['ts'])
+        if event == EventType.ABORT:
+            return self.ABORTS[fields['reason']].format(**fields)
+        if event == EventType.DUMP:
+            variables = fields['variables']
+            return "Site {} - {}{}\n".format(fields['site'], fields['status'],
+                                            "".join(map(" {} : {}".format, variables.keys(), variables.values())))
+        raise ValueError("Unknown event type {}".format(event))
+
+class JsonSink(BufferedSink):
+    """
+    JSON sink writes one JSON object per event (JSON Lines).
+    """
+    def format(self, event: EventType, fields: dict):
+        """
+        Format an event as a JSON object on one line.
+
+        Args:
+            event (EventType): Event type
+            fields (dict): Fields of the event
+
+        Returns:
+            str: Formatted event including the trailing new line
+        """
+        return json.dumps(to_record(event, fields), default=str) + "\n"
+
+def to_record(event: EventType, fields: dict):
+    """
+    Build the JSON object of an event.
+
+    Args:
+        event (EventType): Event type
+        fields (dict): Fields of the event
+
+    Returns:
+        dict: Event type and fields, with the abort reason as its name
+    """
+    record = {'event': event.value}
+    record.update(fields)
+    if event == EventType.ABORT:
+        record['reason'] = fields['reason'].name if fields['reason'] else None
+    return record
+
+def make_sink(kind, stream=None, batch: int=1):
+    """
+    Create an event sink.
+
+    Args:
+        kind (SinkType): Kind of the sink
+        stream (file, optional): Output stream. Defaults to standard output.
+        batch (int, optional): Number of events buffered before they are written. Defaults to 1.
+
+    Returns:
+        EventSink: Event sink of the given kind
+    """
+    kind = SinkType(kind)
+    if kind == SinkType.TEXT:
+        return TextSink(stream, batch)
+    if kind == SinkType.JSON:
+        return JsonSink(stream, batch)
+    return EventSink()
@@ -0,0 +1,84 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import re
+import sys
+from Config import *
+
+# One instruction per line: method(arg, ...), optionally followed by a // comment
+LINE = re.compile(r'\s*(?:(\w+)\s*\(([^)]*)\))?\s*(?://.*)?')
+
+# Converters of the arguments of each operation type
+ARGS = {
+    OperationType.BEGIN: (str,),
+    OperationType.BEGINRO: (str,),
+    OperationType.WRITE: (str, str, int),
+    OperationType.READ: (str, str),
+    OperationType.FAIL: (int,),
+    OperationType.RECOVER: (int,),
+    OperationType.END: (str,),
+    OperationType.DUMP: (),
+}
+
+# Method name -> operation type
+METHODS = {op.value: op for op in OperationType}
+
+class ParseError(ValueError):
+    """
+    Error raised for a line that is not a valid instruction.
+    """
+
+def parse(lines):
+    """
+    Parse instructions lazily from an iterable of lines.
+    Empty lines and comments are skipped, and parsing stops at a line starting with quit or ===.
+
+    Args:
+        lines (iterable): Lines of the input
+
+    Yields:
+        Instruction: Operation type and typed arguments of each instruction
+
+    Raises:
+        ParseError: If a line is not a valid instruction
+    """
+    for line in lines:
+        text = line.strip()
+        if text.startswith('quit') or text.startswith('==='):
+            return
+        match = LINE.fullmatch(text)
+        if not match:
+            raise ParseError("Unrecognized command {}".format(text))
+        method, body = match.groups()
+        if method is None:
+            continue
+        if method not in METHODS:
+            raise ParseError("Unrecognized command {}".format(method))
+        op = METHODS[method]
+        converters = ARGS[op]
+        args = [a.strip() for a in body.split(',')] if body.strip() else []
+        if len(args) != len(converters):
+            raise ParseError("Wrong number of arguments for {}".format(method))
+        try:
+            args = tuple(convert(a) for convert, a in zip(converters, args))
+        except ValueError:
+            raise ParseError("Invalid arguments for {}".format(method))
+        yield Instruction(op, args)
+
+def read_instructions(path: str=None):
+    """
+    Read instructions lazily from a file, or from standard input if no path or '-' is given.
+
+    Args:
+        path (str, optional): Path of the input file
+
+    Yields:
+        Instruction: Operation type and typed arguments of each instruction
+    """
+    if not path or path == '-':
+        yield from parse(sys.stdin)
+        return
+    with open(path, 'r') as f:
+        yield from parse(f)
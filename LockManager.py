@@ -3,23 +3,186 @@ Due on Saturday, 12/03/2022
 
 Author: Wonkwon Lee, Young Il Kim
 """
+from collections import deque
 from Config import *
+from EventSink import EventSink
+
+class LockQueue(object):
+    """
+    Lock queue keeps queued locks in arrival order in a deque, with an index of the queued locks of each transaction
+    and a count of queued write locks. Removed locks are left in the deque and skipped when they reach the head,
+    and the deque is compacted once it holds more removed locks than live ones.
+    A transaction has at most one queued read lock and one queued write lock.
+    """
+    COMPACT = 32    # Minimum number of removed locks before the deque is compacted
+
+    def __init__(self):
+        """
+        Constructor for initializing an empty lock queue.
+        """
+        self.entries = deque()  # Queued locks in arrival order, including removed ones
+        self.index = {}         # Transaction ID -> {lock type -> queued lock}
+        self.size = 0           # Number of live queued locks
+        self.writers = 0        # Number of live queued write locks
+        self.dead = 0           # Number of removed locks still in the deque
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """
+        Iterate over the live queued locks in arrival order.
+        """
+        index = self.index
+        for l in self.entries:
+            if index.get(l.t_id, {}).get(l.type) is l:
+                yield l
+
+    def live(self, qlock):
+        """
+        Check if a lock in the deque is still queued.
+
+        Args:
+            qlock (QLock): Lock in the deque
+
+        Returns:
+            bool: True if the lock has not been removed, False otherwise.
+        """
+        return self.index.get(qlock.t_id, {}).get(qlock.type) is qlock
+
+    def has(self, t_id, lock_type: int=None):
+        """
+        Check if a transaction has a queued lock, of the given type if provided.
+
+        Args:
+            t_id (int): Transaction ID
+            lock_type (int, optional): Lock type. Defaults to None.
+
+        Returns:
+            bool: True if the transaction has such a queued lock, False otherwise.
+        """
+        locks = self.index.get(t_id)
+        return bool(locks) and (lock_type is None or lock_type in locks)
+
+    def append(self, qlock):
+        """
+        Add a lock at the tail of the queue.
+
+        Args:
+            qlock (QLock): Lock to be queued
+        """
+        self.index.setdefault(qlock.t_id, {})[qlock.type] = qlock
+        self.entries.append(qlock)
+        self.size += 1
+        if qlock.type == WRITE_LOCK:
+            self.writers += 1
+
+    def head(self):
+        """
+        Get the lock at the head of the queue, dropping removed locks in front of it.
+
+        Returns:
+            QLock: First live queued lock, or None if the queue is empty.
+        """
+        entries = self.entries
+        while entries:
+            if self.live(entries[0]):
+                return entries[0]
+            entries.popleft()
+            self.dead -= 1
+        return None
+
+    def popleft(self):
+        """
+        Remove and return the lock at the head of the queue.
+
+        Returns:
+            QLock: First live queued lock
+        """
+        qlock = self.head()
+        self.entries.popleft()
+        self.forget(qlock)
+        return qlock
+
+    def forget(self, qlock):
+        """
+        Drop a live lock from the index and the counts.
+
+        Args:
+            qlock (QLock): Live queued lock
+        """
+        locks = self.index[qlock.t_id]
+        del locks[qlock.type]
+        if not locks:
+            del self.index[qlock.t_id]
+        self.size -= 1
+        if qlock.type == WRITE_LOCK:
+            self.writers -= 1
+
+    def remove(self, qlock):
+        """
+        Remove a queued lock. The lock stays in the deque until it reaches the head or the deque is compacted.
+
+        Args:
+            qlock (QLock): Live queued lock
+        """
+        self.forget(qlock)
+        self.dead += 1
+        if self.dead > self.COMPACT and self.dead > self.size:
+            self.entries = deque(l for l in self.entries if self.live(l))
+            self.dead = 0
+
+    def remove_transaction(self, t_id):
+        """
+        Remove every queued lock of a transaction.
+
+        Args:
+            t_id (int): Transaction ID
+
+        Returns:
+            bool: True if a lock was removed, False otherwise.
+        """
+        locks = self.index.get(t_id)
+        if not locks:
+            return False
+        for qlock in list(locks.values()):
+            self.remove(qlock)
+        return True
+
+    def clear(self):
+        """
+        Remove every queued lock.
+        """
+        self.__init__()
 
 class LockManager(object):
     """
     Lock manager is responsible for managing read lock, write lock, and lock queue.
-    A lock manager stores variable id, current lock, and a list of lock in queue.
+    A lock manager stores variable id, current lock, and a queue of locks.
     
     Args:
         v_id (int): Variable ID
+        out (EventSink, optional): Event sink receiving error messages
     """
-    def __init__(self, v_id: int):
+    def __init__(self, v_id: int, out=None):
         """
         Constructor for initializing a lock manager.
         """
+        self.out = out or EventSink()   # Event sink
         self.v_id = v_id        # Variable ID
         self.lock = None        # Current lock
-        self.lock_queue = []    # Lock queue
+        self.lock_queue = LockQueue()   # Lock queue
+
+    def __getstate__(self):
+        """
+        Get the state to snapshot, without the event sink.
+
+        Returns:
+            dict: Attributes of the lock manager
+        """
+        state = self.__dict__.copy()
+        state['out'] = None
+        return state
 
     def process_lock(self, wlock):
         """
@@ -29,16 +192,16 @@ class LockManager(object):
             wlock (lock): Write lock to be processed
         """
         if not self.lock:
-            print("No lock exists")
+            self.out.emit(EventType.ERROR, message="No lock exists")
             return
-        elif not self.lock.type == LockType.READ:
-            print("Current lock is not read lock.")
+        elif not self.lock.type == READ_LOCK:
+            self.out.emit(EventType.ERROR, message="Current lock is not read lock.")
             return
         elif len(self.lock.t_table) != 1:
-            print("There are multiple transactions holding the read lock.")
+            self.out.emit(EventType.ERROR, message="There are multiple transactions holding the read lock.")
             return
         elif wlock.t_id not in self.lock.t_table:
-            print("The transaction holding the read lock is not the same as the transaction holding the write lock.")
+            self.out.emit(EventType.ERROR, message="The transaction holding the read lock is not the same as the transaction holding the write lock.")
             return 
         self.lock = wlock
         # self.set_lock(wlock)
@@ -50,8 +213,8 @@ class LockManager(object):
         Args:
             t_id (int): Transaction ID
         """
-        if not self.lock.type == LockType.READ:
-            print("Current lock is not read lock.")
+        if not self.lock.type == READ_LOCK:
+            self.out.emit(EventType.ERROR, message="Current lock is not read lock.")
             return
         self.lock.t_table.add(t_id)
 
@@ -62,10 +225,8 @@ class LockManager(object):
         Args:
             queue (QLock): Lock to be added to the queue
         """
-        for queued_lock in self.lock_queue:
-            if queued_lock.t_id == queue.t_id:
-                if queued_lock.type == queue.type or queue.type == LockType.READ:
-                    return
+        if self.lock_queue.has(queue.t_id, None if queue.type == READ_LOCK else queue.type):
+            return
         self.lock_queue.append(queue)
 
     def check_wlock(self, t_id=None):
@@ -79,11 +240,10 @@ class LockManager(object):
         Returns:
             bool: True if there is a write lock in the queue, False otherwise.
         """
-        for l in self.lock_queue:
-            if l.type == LockType.WRITE:
-                if t_id and l.t_id == t_id:
-                    continue
-                return True
+        writers = self.lock_queue.writers
+        if t_id and self.lock_queue.has(t_id, WRITE_LOCK):
+            writers -= 1
+        return writers > 0
 
     def release_lock(self, t_id: int):
         """
@@ -91,13 +251,149 @@ class LockManager(object):
 
         Args:
             t_id (int): Transaction ID
+
+        Returns:
+            bool: True if the current lock has changed, False otherwise.
         """
         if self.lock:
-            if self.lock.type == LockType.WRITE:
+            if self.lock.type == WRITE_LOCK:
                 if self.lock.t_id == t_id:
-                    self.lock = None       
+                    self.lock = None
+                    return True
             else:
                 if t_id in self.lock.t_table:
                     self.lock.t_table.remove(t_id)
+                    if not len(self.lock.t_table):
+                        self.lock = None
+                    return True
                 if not len(self.lock.t_table):
-                    self.lock = None
\ No newline at end of file
+                    self.lock = None
+                    return True
+        return False
+
+class LockTable(dict):
+    """
+    Lock table maps the variables of a site to their lock managers. A lock manager is created the first time 
+    its variable is looked up, so a site does not build one per variable up front and never-locked variables 
+    need not be kept in snapshots.
+
+    Args:
+        variables (dict): Variables stored at the site; looking up any other variable raises KeyError
+        out (EventSink, optional): Event sink given to the lock managers
+    """
+    def __init__(self, variables: dict, out=None):
+        """
+        Constructor for initializing an empty lock table.
+        """
+        super().__init__()
+        self.variables = variables
+        self.out = out
+
+    def __missing__(self, v_id: str):
+        """
+        Create the lock manager of a variable on first lookup.
+
+        Args:
+            v_id (str): Variable ID
+
+        Returns:
+            LockManager: Lock manager of the variable
+        """
+        if v_id not in self.variables:
+            raise KeyError(v_id)
+        lm = self[v_id] = LockManager(v_id, self.out)
+        return lm
+
+class SiteLock(object):
+    """
+    Site lock is the coarse level of the lock hierarchy of a site. A transaction locking variables of the site holds 
+    an intention lock on the site (IS to read, IX to write), and may escalate to a lock on the whole site: S to read 
+    every variable, or X to read and write every variable, without a lock per variable. A write under an S lock still 
+    locks its variable, which makes the site lock SIX. Escalation is granted only if the new mode is compatible with 
+    the modes every other transaction holds on the site.
+
+    Intention locks never wait: when another transaction accesses a variable that an escalated transaction has used, 
+    the data manager first gives the escalated transaction the variable lock it would have held, 
+    so the conflict is resolved by the variable lock queue.
+    """
+    COMPATIBLE = {
+        IS_LOCK: {IS_LOCK, IX_LOCK, S_LOCK, SIX_LOCK},
+        IX_LOCK: {IS_LOCK, IX_LOCK},
+        S_LOCK: {IS_LOCK, S_LOCK},
+        SIX_LOCK: {IS_LOCK},
+        X_LOCK: set(),
+    }
+
+    def __init__(self):
+        """
+        Constructor for initializing a site lock held by no transaction.
+        """
+        self.modes = {}             # Transaction ID -> mode held on the site
+        self.counts = [0] * (X_LOCK + 1)    # Number of transactions holding each mode
+        self.escalated = {}         # Transactions holding an S, SIX, or X lock -> variable used without a variable lock 
+                                    # -> type of the lock it stands for
+
+    def hold(self, t_id: int, mode: int):
+        """
+        Add a mode to the site lock of a transaction. The held mode becomes the weakest mode covering both.
+
+        Args:
+            t_id (int): Transaction ID
+            mode (int): Requested site lock type
+        """
+        held = self.modes.get(t_id)
+        if held == mode or held == X_LOCK:
+            return
+        if held is None:
+            new = mode
+        elif held == IX_LOCK and mode == S_LOCK or held == S_LOCK and mode == IX_LOCK:
+            new = SIX_LOCK
+        else:
+            new = max(held, mode)
+            if new == held:
+                return
+        if held is not None:
+            self.counts[held] -= 1
+        self.counts[new] += 1
+        self.modes[t_id] = new
+        if new >= S_LOCK and t_id not in self.escalated:
+            self.escalated[t_id] = {}
+
+    def escalate(self, t_id: int):
+        """
+        Escalate the intention lock of a transaction to a lock on the whole site: X if it writes at the site, S otherwise.
+
+        Args:
+            t_id (int): Transaction ID
+
+        Returns:
+            bool: True if the site lock is granted, False if another transaction holds a conflicting mode
+        """
+        held = self.modes[t_id]
+        mode = X_LOCK if held == IX_LOCK else S_LOCK
+        compatible = self.COMPATIBLE[mode]
+        for other, count in enumerate(self.counts):
+            if other == held:
+                count -= 1
+            if count and other not in compatible:
+                return False
+        self.hold(t_id, mode)
+        return True
+
+    def release(self, t_id: int):
+        """
+        Release the site lock of a transaction.
+
+        Args:
+            t_id (int): Transaction ID
+        """
+        held = self.modes.pop(t_id, None)
+        if held is not None:
+            self.counts[held] -= 1
+            self.escalated.pop(t_id, None)
+
+    def clear(self):
+        """
+        Release every site lock, e.g. when the site fails.
+        """
+        self.__init__()
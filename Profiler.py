@@ -0,0 +1,126 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import cProfile
+import json
+import pstats
+import sys
+from time import perf_counter
+
+class Profiler(object):
+    """
+    Phase profiler records the cumulative wall time and the number of calls of each phase of a tick
+    (deadlock check, operation retries, commit, abort, lock hand-off) and of each operation type.
+    Phases are timed by wrapping the methods of one transaction manager and its data managers,
+    so nothing is added to the code path when profiling is off. Times are inclusive, e.g. `end` contains `commit`.
+
+    Args:
+        cprofile (bool, optional): If True, the run is also profiled function by function with cProfile. Defaults to False.
+    """
+    PHASES = ('check_deadlock', 'run_operation', 'commit_group', 'abort')   # Transaction manager methods
+    SITE_PHASES = ('release_all_lock',)                                 # Data manager methods
+    TOP = 30                                                            # Functions listed from cProfile
+
+    def __init__(self, cprofile: bool=False):
+        """
+        Constructor for initializing a profiler.
+        """
+        self.phases = {}        # Phase name -> [calls, seconds]
+        self.operations = {}    # Operation type -> [calls, seconds]
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self.start = None
+        self.elapsed = 0.0
+        self.tm = None          # Instrumented transaction manager
+
+    def timed(self, func, entry: list):
+        """
+        Wrap a function so that its calls and wall time are added to an entry.
+
+        Args:
+            func (callable): Function to time
+            entry (list): Calls and seconds of the phase
+
+        Returns:
+            callable: Timed function
+        """
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+        return wrapper
+
+    def instrument(self, tm):
+        """
+        Time the phases and the operation handlers of a transaction manager.
+
+        Args:
+            tm (TransactionManager): Transaction manager to instrument
+        """
+        self.tm = tm
+        for name in self.PHASES:
+            setattr(tm, name, self.timed(getattr(tm, name), self.phases.setdefault(name, [0, 0.0])))
+        for name in self.SITE_PHASES:
+            entry = self.phases.setdefault(name, [0, 0.0])
+            for dm in tm.dm_list:
+                setattr(dm, name, self.timed(getattr(dm, name), entry))
+        for op, handler in tm.handlers.items():
+            tm.handlers[op] = self.timed(handler, self.operations.setdefault(op.value, [0, 0.0]))
+
+    def begin(self):
+        """
+        Start the clock and cProfile if enabled.
+        """
+        self.start = perf_counter()
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def end(self):
+        """
+        Stop the clock and cProfile if enabled.
+        """
+        if self.cprofile:
+            self.cprofile.disable()
+        if self.start is not None:
+            self.elapsed += perf_counter() - self.start
+            self.start = None
+
+    def report(self):
+        """
+        Build the profiling report.
+
+        Returns:
+            dict: Total time, phases, operation types, reads served by each site, and the top cProfile functions if enabled
+        """
+        def table(entries):
+            return {name: {'calls': calls, 'seconds': seconds, 'mean_us': seconds / calls * 1e6 if calls else 0.0,
+                           'share': seconds / self.elapsed if self.elapsed else 0.0}
+                    for name, (calls, seconds) in entries.items()}
+        report = {'seconds': self.elapsed, 'phases': table(self.phases), 'operations': table(self.operations)}
+        if self.tm:
+            report['site_reads'] = self.tm.replicas.distribution()
+        if self.cprofile:
+            stats = pstats.Stats(self.cprofile)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.TOP]
+            report['cprofile'] = [{'function': "{}:{}({})".format(*key), 'calls': calls, 'tottime': tottime,
+                                   'cumtime': cumtime}
+                                  for key, (_, calls, tottime, cumtime, _) in functions]
+        return report
+
+    def write(self, path: str):
+        """
+        Write the profiling report as JSON.
+
+        Args:
+            path (str): Output file, or - for standard error
+        """
+        text = json.dumps(self.report(), indent=2)
+        if path == '-':
+            sys.stderr.write(text + "\n")
+        else:
+            with open(path, 'w') as f:
+                f.write(text + "\n")
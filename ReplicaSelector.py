@@ -0,0 +1,220 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+from collections import defaultdict
+from Config import *
+
+class ReplicaSelector(object):
+    """
+    Replica selector orders the running sites storing a variable for a read, which is tried at the first site of the order.
+    The base selector keeps site order, so most reads of replicated variables go to the lowest running site.
+    Every selector counts the reads served by each site.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing a replica selector.
+        """
+        self.reads = defaultdict(int)   # Site ID -> number of reads served
+
+    def order(self, t_id: str, v_id: str, sites: list):
+        """
+        Order the sites to try for a read.
+
+        Args:
+            t_id (str): Transaction ID
+            v_id (str): Variable ID
+            sites (list[DataManager]): Running sites storing the variable in site order
+
+        Returns:
+            list[DataManager]: Sites in the order they are tried
+        """
+        return sites
+
+    def record(self, t_id: str, site_id: int):
+        """
+        Count a read served by a site.
+
+        Args:
+            t_id (str): Transaction ID
+            site_id (int): Site ID
+        """
+        self.reads[site_id] += 1
+
+    def forget(self, t_id: str):
+        """
+        Drop what is kept for a transaction once it ends.
+
+        Args:
+            t_id (str): Transaction ID
+        """
+        pass
+
+    def distribution(self):
+        """
+        Get the number of reads served by each site.
+
+        Returns:
+            dict: Site ID -> number of reads, in site order
+        """
+        return dict(sorted(self.reads.items()))
+
+class RoundRobinSelector(ReplicaSelector):
+    """
+    Round-robin selector starts the reads of each variable at its readable sites in turn.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing a round-robin selector.
+        """
+        super().__init__()
+        self.turn = defaultdict(int)    # Variable ID -> number of reads ordered so far
+
+    def order(self, t_id: str, v_id: str, sites: list):
+        """
+        Rotate the readable sites by the number of reads of the variable so far, followed by the other sites.
+
+        Args:
+            t_id (str): Transaction ID
+            v_id (str): Variable ID
+            sites (list[DataManager]): Running sites storing the variable in site order
+
+        Returns:
+            list[DataManager]: Sites in the order they are tried
+        """
+        readable, other = split_readable(v_id, sites)
+        if len(readable) > 1:
+            k = self.turn[v_id] % len(readable)
+            self.turn[v_id] += 1
+            readable = readable[k:] + readable[:k]
+        return readable + other
+
+class LeastQueuedSelector(ReplicaSelector):
+    """
+    Least-queued selector starts a read at the readable site with the fewest locks queued on the variable,
+    in site order among equally loaded sites.
+    """
+    def order(self, t_id: str, v_id: str, sites: list):
+        """
+        Order the readable sites by the number of locks queued on the variable, followed by the other sites.
+
+        Args:
+            t_id (str): Transaction ID
+            v_id (str): Variable ID
+            sites (list[DataManager]): Running sites storing the variable in site order
+
+        Returns:
+            list[DataManager]: Sites in the order they are tried
+        """
+        readable, other = split_readable(v_id, sites)
+        readable.sort(key=lambda dm: queued(dm, v_id))
+        return readable + other
+
+class StickySelector(ReplicaSelector):
+    """
+    Sticky selector sends every read of a transaction to the same site where that site stores a readable copy,
+    so a transaction's read locks stay in one site's lock table. Transactions are given home sites in turn.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing a sticky selector.
+        """
+        super().__init__()
+        self.home = {}      # Transaction ID -> (site serving its reads, turn in which it was assigned)
+        self.assigned = 0   # Number of transactions given a home site
+
+    def order(self, t_id: str, v_id: str, sites: list):
+        """
+        Put the transaction's home site first, or the next site in turn if it has none yet, followed by the other sites.
+
+        Args:
+            t_id (str): Transaction ID
+            v_id (str): Variable ID
+            sites (list[DataManager]): Running sites storing the variable in site order
+
+        Returns:
+            list[DataManager]: Sites in the order they are tried
+        """
+        readable, other = split_readable(v_id, sites)
+        if len(readable) > 1:
+            home = self.home.get(t_id)
+            if home is None:
+                k = self.assigned % len(readable)
+            else:
+                # Without a readable copy at the home site, the transaction keeps its turn
+                site_id, turn = home
+                k = next((k for k, dm in enumerate(readable) if dm.site_id == site_id), turn % len(readable))
+            readable = readable[k:] + readable[:k]
+        return readable + other
+
+    def record(self, t_id: str, site_id: int):
+        """
+        Count a read served by a site, which becomes the transaction's home site if it has none.
+
+        Args:
+            t_id (str): Transaction ID
+            site_id (int): Site ID
+        """
+        super().record(t_id, site_id)
+        if t_id not in self.home:
+            self.home[t_id] = (site_id, self.assigned)
+            self.assigned += 1
+
+    def forget(self, t_id: str):
+        """
+        Drop the home site of a transaction once it ends.
+
+        Args:
+            t_id (str): Transaction ID
+        """
+        self.home.pop(t_id, None)
+
+def split_readable(v_id: str, sites: list):
+    """
+    Split the sites into those where a variable is readable and the others, keeping site order.
+
+    Args:
+        v_id (str): Variable ID
+        sites (list[DataManager]): Running sites storing the variable
+
+    Returns:
+        tuple: Sites with a readable copy, and the other sites
+    """
+    readable, other = [], []
+    for dm in sites:
+        (readable if dm.data_table[v_id].readable else other).append(dm)
+    return readable, other
+
+def queued(dm, v_id: str):
+    """
+    Count the locks queued on a variable at a site.
+
+    Args:
+        dm (DataManager): Data manager of the site
+        v_id (str): Variable ID
+
+    Returns:
+        int: Number of queued locks
+    """
+    lm = dm.lock_table.get(v_id)
+    return len(lm.lock_queue) if lm else 0
+
+def make_selector(kind):
+    """
+    Create a replica selector.
+
+    Args:
+        kind (ReplicaType): Replica selection policy
+
+    Returns:
+        ReplicaSelector: Replica selector of the given kind
+    """
+    kind = ReplicaType(kind)
+    if kind == ReplicaType.ROUND_ROBIN:
+        return RoundRobinSelector()
+    if kind == ReplicaType.LEAST_QUEUED:
+        return LeastQueuedSelector()
+    if kind == ReplicaType.STICKY:
+        return StickySelector()
+    return ReplicaSelector()
@@ -0,0 +1,272 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import defaultdict
+from time import perf_counter
+from Config import *
+from EventSink import EventSink, to_record
+from InputParser import ParseError, parse
+from TransactionManager import TransactionManager
+
+class ServerSink(EventSink):
+    """
+    Server sink collects the events of the current tick and completes the pending reads and writes of each transaction.
+    A read or write completes with the read or write event of its own operation, which is the operation the transaction manager 
+    is running when the event is emitted, or with the abort of its transaction. Pipelined operations of a transaction may 
+    therefore complete out of order.
+
+    Args:
+        log (EventSink, optional): Sink receiving every event as well, e.g. a text log
+    """
+    def __init__(self, log=None):
+        """
+        Constructor for initializing a server sink.
+        """
+        self.log = log or EventSink()
+        self.tm = None                      # Transaction manager emitting the events
+        self.tick = []                      # Events of the current tick
+        self.pending = defaultdict(dict)    # Transaction ID -> operation -> future of its read or write
+        self.answered = {}                  # Operations and transactions answered before their future was added -> events
+
+    def emit(self, event: EventType, **fields):
+        """
+        Collect an event and complete the futures it answers.
+
+        Args:
+            event (EventType): Event type
+            **fields: Fields of the event
+        """
+        self.log.emit(event, **fields)
+        if event == EventType.COMMAND:
+            return
+        record = to_record(event, fields)
+        self.tick.append(record)
+        t_id = fields.get('t_id')
+        if t_id is None:
+            return
+        if event in (EventType.READ, EventType.WRITE):
+            op = self.tm.running
+            futures = self.pending.get(t_id)
+            if futures and op in futures:
+                futures.pop(op).set_result([record])
+                if not futures:
+                    del self.pending[t_id]
+            else:
+                # The operation completed in the tick that added it
+                self.answered[op] = [record]
+        elif event in (EventType.ABORT, EventType.NO_TRANSACTION):
+            for future in self.pending.pop(t_id, {}).values():
+                future.set_result([record])
+            self.answered[t_id] = [record]
+
+    def flush(self):
+        """
+        Write out the log.
+        """
+        self.log.flush()
+
+class ClientStats(object):
+    """
+    Client stats keep the latency of every request of one client.
+
+    Args:
+        name (str): Name of the client
+    """
+    def __init__(self, name: str):
+        """
+        Constructor for initializing the stats of a client.
+        """
+        self.name = name
+        self.latencies = []     # Seconds from receipt to response of each request
+
+    def summary(self):
+        """
+        Summarize the latencies of the client.
+
+        Returns:
+            dict: Number of requests and mean, median, 99th percentile, and maximum latency in milliseconds
+        """
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+        if not n:
+            return {'client': self.name, 'requests': 0}
+        return {'client': self.name, 'requests': n, 'mean_ms': sum(latencies) / n * 1e3,
+                'p50_ms': latencies[n // 2] * 1e3, 'p99_ms': latencies[min(n - 1, n * 99 // 100)] * 1e3,
+                'max_ms': latencies[-1] * 1e3}
+
+class Server(object):
+    """
+    Server runs one transaction manager for many concurrent clients on a TCP or Unix socket.
+    Clients send instructions in the input grammar, one per line, and may pipeline them without waiting for responses.
+    Each instruction is answered with one JSON line holding its per-client sequence number, its events, and its latency.
+    A read or write that blocks is answered once it completes or its transaction aborts, so responses may arrive out of order.
+    Instructions run one at a time on the event loop in arrival order across clients.
+
+    Args:
+        tm (TransactionManager): Transaction manager serving the clients
+        sink (ServerSink): Event sink of the transaction manager
+    """
+    def __init__(self, tm: TransactionManager, sink: ServerSink):
+        """
+        Constructor for initializing a server.
+        """
+        self.tm = tm
+        self.sink = sink
+        sink.tm = tm
+        self.clients = []       # Stats of every client, connected or not
+        self.polling = False    # Flag to indicate that a deadlock check is scheduled
+
+    def execute(self, instruction):
+        """
+        Run one instruction on the transaction manager.
+
+        Args:
+            instruction (Instruction): Operation type and typed arguments
+
+        Returns:
+            asyncio.Future: Future completed with the events answering the instruction
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.sink.tick = []
+        self.sink.answered = {}
+        op = self.tm.execute(instruction)
+        if instruction.type in (OperationType.READ, OperationType.WRITE):
+            t_id = instruction.args[0]
+            answer = self.sink.answered.get(op) or self.sink.answered.get(t_id)
+            if answer:
+                future.set_result(answer)
+            else:
+                self.sink.pending[t_id][op] = future
+        else:
+            future.set_result(self.sink.tick)
+        if self.sink.pending and not self.polling:
+            self.polling = True
+            asyncio.get_running_loop().call_soon(self.poll)
+        return future
+
+    def poll(self):
+        """
+        Look for a deadlock and retry woken operations among blocked clients, 
+        which cannot send another instruction to trigger the next tick.
+        """
+        self.polling = False
+        idle = False    # Flag to indicate that the last pass completed nothing
+        while True:
+            # No new instruction arrives while every client waits, so that counts as a stall
+            self.tm.stalled = self.tm.all_blocked()
+            if self.tm.check_deadlock():
+                idle = False
+            elif idle or not self.tm.waiters.heap:
+                break
+            idle = not self.tm.run_operation(drain=True)
+
+    async def handle(self, reader, writer):
+        """
+        Serve one client until it disconnects or sends quit.
+
+        Args:
+            reader (StreamReader): Stream of the client's instructions
+            writer (StreamWriter): Stream of the responses
+        """
+        peer = writer.get_extra_info('peername') or 'unix'
+        stats = ClientStats("{}#{}".format(peer, len(self.clients) + 1))
+        self.clients.append(stats)
+        seq = 0
+        outstanding = set()
+
+        def respond(future, seq, start):
+            latency = perf_counter() - start
+            stats.latencies.append(latency)
+            response = {'id': seq, 'events': future.result(), 'latency_ms': latency * 1e3}
+            if not writer.is_closing():
+                writer.write((json.dumps(response, default=str) + "\n").encode())
+            outstanding.discard(future)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or line.strip().startswith(b'quit'):
+                    break
+                start = perf_counter()
+                try:
+                    instructions = list(parse([line.decode()]))
+                except ParseError as e:
+                    seq += 1
+                    writer.write((json.dumps({'id': seq, 'error': str(e)}) + "\n").encode())
+                    continue
+                for instruction in instructions:
+                    seq += 1
+                    future = self.execute(instruction)
+                    outstanding.add(future)
+                    future.add_done_callback(lambda f, seq=seq, start=start: respond(f, seq, start))
+                await writer.drain()
+            if outstanding:
+                await asyncio.wait(list(outstanding))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sink.flush()
+            writer.close()
+
+    def report(self):
+        """
+        Get the latency summary of every client.
+
+        Returns:
+            list[dict]: Summary of each client
+        """
+        return [stats.summary() for stats in self.clients]
+
+async def serve(server: Server, host: str=None, port: int=None, path: str=None):
+    """
+    Accept clients on a Unix socket if a path is given, otherwise on a TCP socket.
+
+    Args:
+        server (Server): Server handling the clients
+        host (str, optional): TCP host
+        port (int, optional): TCP port
+        path (str, optional): Unix socket path
+
+    Returns:
+        asyncio.Server: Listening socket server
+    """
+    if path:
+        return await asyncio.start_unix_server(server.handle, path=path)
+    return await asyncio.start_server(server.handle, host, port)
+
+if __name__ == '__main__':
+    """
+    Run the transaction manager as a service until interrupted, then print the latency of every client.
+    """
+    parser = argparse.ArgumentParser(description='Replicated Concurrency Control and Recovery service')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=7070, help='TCP port (default 7070)')
+    parser.add_argument('--unix', help='listen on a Unix socket at this path instead of TCP')
+    parser.add_argument('--sites', type=int, default=10, help='number of sites (default 10)')
+    parser.add_argument('--variables', type=int, default=20, help='number of variables (default 20)')
+    parser.add_argument('--policy', choices=[p.value for p in PolicyType], default=PolicyType.DETECTION.value,
+                        help='lock conflicts: deadlock detection, wait-die, or wound-wait (default detection)')
+    options = parser.parse_args()
+
+    sink = ServerSink()
+    tm = TransactionManager(Topology(options.sites, options.variables), out=sink, policy=options.policy)
+    server = Server(tm, sink)
+
+    async def main():
+        listener = await serve(server, options.host, options.port, options.unix)
+        async with listener:
+            await listener.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for summary in server.report():
+            sys.stderr.write(json.dumps(summary) + "\n")
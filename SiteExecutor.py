@@ -0,0 +1,87 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+class SiteExecutor(object):
+    """
+    Site executor runs site-local work of the data managers, one batch per call.
+    With one worker, sites are visited one by one in the calling thread. With more workers, sites are sharded into
+    contiguous groups and each group runs as one task of a thread pool, which spreads across cores on free-threaded Python.
+    While a site runs in a worker, its notifications to the shared waits-for graph, waiter index, and event sink are
+    recorded and replayed afterwards in site order, so the output is the same as with one worker.
+    Threads only add overhead while the GIL is enabled, so there the executor warns and runs the sites in the calling thread.
+
+    Args:
+        workers (int, optional): Number of worker threads. Defaults to 1, no pool.
+    """
+    def __init__(self, workers: int=1):
+        """
+        Constructor for initializing a site executor.
+        """
+        self.workers = max(1, workers)
+        if self.workers > 1 and gil_enabled():
+            warnings.warn("Site workers need free-threaded Python, running the sites serially", RuntimeWarning, 
+                          stacklevel=2)
+            self.workers = 1
+        self.pool = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+
+    def map(self, func, dm_list: list):
+        """
+        Run a function on every data manager.
+
+        Args:
+            func (callable): Function taking a data manager
+            dm_list (list[DataManager]): Data managers in site order
+
+        Returns:
+            list: Results in site order
+        """
+        if not self.pool or len(dm_list) < 2:
+            return [func(dm) for dm in dm_list]
+        size = -(-len(dm_list) // self.workers)
+        shards = [dm_list[k:k + size] for k in range(0, len(dm_list), size)]
+        for dm in dm_list:
+            dm.deferred = []
+        futures = [self.pool.submit(run_shard, func, shard) for shard in shards]
+        results = []
+        try:
+            for future in futures:
+                results.extend(future.result())
+        finally:
+            for dm in dm_list:
+                dm.replay()
+        return results
+
+    def close(self):
+        """
+        Shut down the worker threads.
+        """
+        if self.pool:
+            self.pool.shutdown()
+
+def gil_enabled():
+    """
+    Check if the GIL is enabled, which is always the case before Python 3.13.
+
+    Returns:
+        bool: True if threads cannot run Python code in parallel, False on free-threaded Python
+    """
+    return getattr(sys, '_is_gil_enabled', lambda: True)()
+
+def run_shard(func, shard: list):
+    """
+    Run a function on a group of data managers in one worker.
+
+    Args:
+        func (callable): Function taking a data manager
+        shard (list[DataManager]): Data managers of the group
+
+    Returns:
+        list: Results in site order
+    """
+    return [func(dm) for dm in shard]
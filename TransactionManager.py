@@ -4,28 +4,250 @@ Due on Saturday, 12/03/2022
 Author: Wonkwon Lee, Young Il Kim
 
 """
+import os
+import pickle
 from Config import *
+from CommitLog import CommitLog
 from DataManager import DataManager
+from WaitsForGraph import WaitsForGraph
+from WaiterIndex import WaiterIndex
+from ColumnStore import inconsistent
+from SiteExecutor import SiteExecutor
+from ReplicaSelector import make_selector
+from EventSink import TextSink
 from collections import defaultdict
+from time import perf_counter
+
+SNAPSHOT_MAGIC = b'REPCREC-SNAPSHOT-1\n'    # Header of a snapshot file
 
 class TransactionManager(object):
     """
     Transaction manager is responsible for managing transactions.
-    Each transaction manager has a list of data managers, transaction table, and operation list.
-    Data manager list is initialized with 10 data managers.
+    Each transaction manager has a list of data managers, transaction table, and an index of pending operations.
+    Data manager list is initialized with one data manager per site of the topology.
+
+    Args:
+        topology (Topology, optional): Shape of the database. Defaults to 10 sites and 20 variables.
+        gc (GCMode, optional): Multiversion garbage collection mode. Defaults to pruning at commit time.
+        gc_interval (int, optional): Number of commits between two sweeps when gc is SWEEP.
+        columnar (bool, optional): Whether each site mirrors its latest committed state in a column store.
+        out (EventSink, optional): Event sink receiving the output. Defaults to text on standard output.
+        policy (PolicyType, optional): Handling of lock conflicts. Defaults to deadlock detection.
+        detect_interval (int, optional): Minimum number of ticks between two deadlock detections. Defaults to every tick.
+        detect_age (int, optional): Number of ticks after which a new wait edge is checked regardless of the interval.
+            Defaults to None, waiting for the interval.
+        site_workers (int, optional): Number of threads running site-local work (commit, abort, lock release, 
+            waits-for graph fragments, dump). Defaults to 1, running it in the calling thread.
+        wal (str, optional): Directory of the write-ahead logs, one subdirectory per site. If it holds logs from an 
+            earlier run, the committed values are restored from them. Defaults to None, keeping commits in memory only.
+        fsync_interval (int, optional): Commits of a site between two syncs of its log. Defaults to 64.
+        checkpoint_interval (int, optional): Commits of a site between two checkpoints of its log. Defaults to 4096.
+        group_window (int, optional): Number of ticks over which commits are buffered and applied together. 
+            Defaults to 1, applying each commit in the tick of its end.
+        replicas (ReplicaType, optional): Selection of the site serving a read of a replicated variable. 
+            Defaults to the first running site.
+        escalation (int, optional): Number of variables a transaction touches at a site before its variable locks there 
+            are escalated to a site lock. Defaults to None, keeping variable locks only.
     """
-    transaction_table = {}  # Transaction table
-    operation_list = []     # List of read/write operations
-    ts = 0                  # Time stamp
     
-    def __init__(self):
+    def __init__(self, topology=None, gc=GCMode.COMMIT, gc_interval: int=1000, columnar=False, out=None,
+                 policy=PolicyType.DETECTION, detect_interval: int=1, detect_age: int=None, site_workers: int=1,
+                 wal: str=None, fsync_interval: int=64, checkpoint_interval: int=4096, group_window: int=1,
+                 replicas=ReplicaType.FIRST, escalation: int=None):
         """
-        Initialize the transaction manager with 10 data managers.
+        Initialize the transaction manager with a data manager for each site.
         """    
+        self.out = out or TextSink()    # Event sink
+        self.transaction_table = {}     # Transaction table
+        self.ts = 0                     # Time stamp
+        self.topology = topology or Topology()
+        self.gc = GCMode(gc)            # Multiversion garbage collection mode
+        self.gc_interval = gc_interval  # Commits between two sweeps
+        self.commits = 0                # Number of committed transactions
+        self.ro_active = {}             # Active read-only transactions -> begin timestamp, oldest first
+        self.policy = PolicyType(policy)
+        # The waits-for graph is only maintained for deadlock detection
+        self.graph = WaitsForGraph() if self.policy == PolicyType.DETECTION else None
+        prevent = None if self.policy == PolicyType.DETECTION else self.prevent
+        self.doomed = {}                # Transactions to abort by the prevention policy -> abort type
+        self.ticks = 0                  # Number of executed instructions
+        self.detect_interval = detect_interval
+        self.detect_age = detect_age
+        self.last_detection = 0         # Tick of the last deadlock detection
+        self.waiting_since = None       # Tick at which a wait edge not yet checked appeared
+        self.stalled = False            # Flag to indicate that the last tick completed nothing and every transaction waits
+        self.waiters = WaiterIndex()    # Pending read/write operations
+        self.group_window = max(1, group_window)
+        self.group = {}                 # Transactions decided to commit but not yet applied -> commit timestamp, in order
+        self.group_tick = 0             # Tick of the first commit in the group
+        self.replica_type = ReplicaType(replicas)
+        self.replicas = make_selector(replicas)    # Orders the sites tried by a read and counts reads per site
+        self.blocked_on = None          # Lock or variable the last failed operation is waiting for
+        self.running = None             # Operation being run, which the read and write events answer
+        self.sites = SiteExecutor(site_workers)    # Runs site-local work of the data managers
         self.dm_list = []
-        for dm in range(1, 11):
-            self.dm_list.append(DataManager(dm))
+        for dm in range(1, self.topology.sites + 1):
+            log = None
+            if wal:
+                log = CommitLog(os.path.join(wal, "site{}".format(dm)), fsync_interval=fsync_interval, 
+                                checkpoint_interval=checkpoint_interval)
+            self.dm_list.append(DataManager(dm, self.graph, self.waiters, self.topology, columnar, self.out, prevent, 
+                                            log, escalation))
+        self.recovery = self.restore() if wal else None     # Statistics of restoring the sites from their logs
+
+        # Placement index: variable -> sites storing it, and up/down status of each site
+        placement = defaultdict(list)
+        for dm in self.dm_list:
+            for v_id in dm.data_table:
+                placement[v_id].append(dm.site_id)
+        self.placement = {v_id: tuple(sites) for v_id, sites in placement.items()}
+        self.site_up = bytearray([1]) * (self.topology.sites + 1)
+
+        self.handlers = self.bind_handlers()
+
+    def bind_handlers(self):
+        """
+        Map each operation type to the method running it.
+
+        Returns:
+            dict: Operation type -> bound method
+        """
+        return {
+            OperationType.BEGIN: self.begin,
+            OperationType.BEGINRO: self.beginRO,
+            OperationType.WRITE: self.write_operation,
+            OperationType.READ: self.read_operation,
+            OperationType.FAIL: self.fail,
+            OperationType.RECOVER: self.recover,
+            OperationType.END: self.end,
+            OperationType.DUMP: self.dump,
+        }
+
+    def save(self, path: str):
+        """
+        Write a binary snapshot of the whole state: version chains, failure and recovery histories, locks and lock queues, 
+        active transactions, pending operations, and the clock. The event sink, the site executor, and the write-ahead logs
+        are not part of the snapshot. The snapshot is written to a temporary file and renamed.
+
+        Args:
+            path (str): Path of the snapshot
+        """
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, out=None, site_workers: int=1):
+        """
+        Load a transaction manager from a binary snapshot. Records are rebuilt by the unpickler without calling 
+        their constructors.
+
+        Args:
+            path (str): Path of the snapshot
+            out (EventSink, optional): Event sink receiving the output. Defaults to text on standard output.
+            site_workers (int, optional): Number of threads running site-local work. Defaults to 1.
+
+        Returns:
+            TransactionManager: Transaction manager in the state it was saved in
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError("{} is not a snapshot".format(path))
+            tm = pickle.load(f)
+        tm.out = out or TextSink()
+        tm.sites = SiteExecutor(site_workers)
+        tm.handlers = tm.bind_handlers()
+        for dm in tm.dm_list:
+            dm.attach(tm.out)
+        return tm
+
+    def __getstate__(self):
+        """
+        Get the state to snapshot, without the event sink, the site executor, and the bound handlers.
+
+        Returns:
+            dict: Attributes of the transaction manager
+        """
+        state = self.__dict__.copy()
+        for k in ('out', 'sites', 'handlers'):
+            del state[k]
+        # Methods timed by the profiler are instance attributes shadowing the methods of the class
+        for k in [k for k in state if callable(getattr(type(self), k, None))]:
+            del state[k]
+        return state
+
+    def restore(self):
+        """
+        Restore every site from its write-ahead log and move the clock past the latest restored commit.
+
+        Returns:
+            dict: Number of checkpointed values and replayed records over all sites, and the wall time in seconds
+        """
+        start = perf_counter()
+        stats = self.sites.map(DataManager.restore, self.dm_list)
+        self.ts = max([self.ts] + [s['ts'] for s in stats])
+        return {'checkpointed': sum(s['checkpointed'] for s in stats), 'records': sum(s['records'] for s in stats),
+                'seconds': perf_counter() - start}
+
+    def close(self):
+        """
+        Sync and close the write-ahead logs and shut down the site executor.
+        """
+        for dm in self.dm_list:
+            if dm.log:
+                dm.log.close()
+        self.sites.close()
+
+    def running_sites(self, v_id: str):
+        """
+        Find the running sites storing a variable from the placement index.
+
+        Args:
+            v_id (str): Variable id
+
+        Returns:
+            list[DataManager]: Data managers of the running sites in site order
+        """
+        return [self.dm_list[site_id - 1] for site_id in self.placement.get(v_id, ()) if self.site_up[site_id]]
     
+    def execute(self, instruction):
+        """
+        Run one instruction as a tick: look for a deadlock, echo and run the instruction, then run ready operations.
+        A tick in which no operation completes while every transaction is blocked forces the next deadlock detection.
+        Buffered commits are applied before any instruction other than begin and end, and once the group window ends.
+
+        Args:
+            instruction (Instruction): Operation type and typed arguments
+
+        Returns:
+            Operation: Read or write operation added by the instruction, or None
+        """
+        self.ticks += 1
+        # Buffered commits only wait across begin and end instructions, which do not observe them
+        if self.group and instruction.type not in (OperationType.BEGIN, OperationType.END):
+            self.commit_group()
+        if self.check_deadlock():
+            self.run_operation()
+        self.out.emit(EventType.COMMAND, method=instruction.type.value, args=list(instruction.args))
+        op = self.handlers[instruction.type](*instruction.args)
+        if self.group and self.ticks - self.group_tick + 1 >= self.group_window:
+            self.commit_group()
+        done = self.run_operation()
+        self.stalled = not done and self.all_blocked()
+        return op
+
+    def all_blocked(self):
+        """
+        Check if there are at least as many pending operations as read-write transactions, i.e. every transaction waits.
+
+        Returns:
+            bool: True if every read-write transaction is blocked, False otherwise
+        """
+        pending = self.waiters.pending()
+        return pending > 0 and pending >= len(self.transaction_table) - len(self.ro_active)
+
     def read_operation(self, t_id: int, v_id: int):
         """
         Add read operation to the operation list.
@@ -33,12 +255,17 @@ class TransactionManager(object):
         Args:
             t_id (int): Transaction id
             v_id (int): Variable id
+
+        Returns:
+            Operation: Added read operation, or None if the transaction does not exist
         """
         if not t_id in self.transaction_table:
-            print("Transaction table does not contains {}".format(t_id),'\n')
+            self.out.emit(EventType.NO_TRANSACTION, t_id=t_id)
             return
         self.ts += 1
-        self.operation_list.append(Operation('R', t_id, v_id, None))
+        op = Operation('R', t_id, v_id, None)
+        self.waiters.add(op)
+        return op
     
     def write_operation(self, t_id: int, v_id: int, val: int):
         """
@@ -48,28 +275,44 @@ class TransactionManager(object):
             t_id (int): Transaction id
             v_id (int): Variable id
             val (int): Value to write
+
+        Returns:
+            Operation: Added write operation, or None if the transaction does not exist
         """
         if not t_id in self.transaction_table:
-            print("Transaction table does not contains {}".format(t_id),'\n')
+            self.out.emit(EventType.NO_TRANSACTION, t_id=t_id)
             return
         self.ts += 1
-        self.operation_list.append(Operation('W', t_id, v_id, val))
+        op = Operation('W', t_id, v_id, val)
+        self.waiters.add(op)
+        return op
     
-    def run_operation(self):
+    def run_operation(self, drain: bool=False):
         """
-        Run operations in the operation list in order. 
+        Run ready operations in arrival order. 
         If the operation is read, read the variable from the transaction. 
         If the operation is write, write the variable to the transaction.
-        """
-        for op in self.operation_list:
-            if not op.t_id in self.transaction_table:
-                # print("Transaction id {} not in table".format(operation.t_id))
-                self.operation_list.remove(op)
-            else:
+        A blocked operation is parked until the lock or the variable it is waiting for changes.
+
+        Args:
+            drain (bool, optional): If True, every ready operation runs once even if an earlier one is woken up 
+                during the pass. Defaults to False.
+
+        Returns:
+            int: Number of operations that completed
+        """
+        done = 0
+        retry = True
+        while retry:
+            retry = False
+            for seq, op in self.waiters.ready(drain):
+                if not op.t_id in self.transaction_table:
+                    # print("Transaction id {} not in table".format(operation.t_id))
+                    continue
                 result = False
+                self.blocked_on = op.v_id
+                self.running = op
                 if op.op == 'R':    # Read operation
-                    # print("================ TM :: RUN_OPERATION ================")
-                    # print("self.transaction_table[{}].is_ro :: {}".format(operation.t_id,self.transaction_table[operation.t_id].is_ro))
                     if self.transaction_table[op.t_id].is_ro:
                         result = self.read_snapshot(op.t_id, op.v_id)
                     else:
@@ -77,9 +320,21 @@ class TransactionManager(object):
                 elif op.op == 'W': # Write operation
                     result = self.write(op.t_id, op.v_id, op.val)              
                 else: 
-                    print("Invalid operation")
-                if result:   
-                    self.operation_list.remove(op)
+                    self.out.emit(EventType.ERROR, message="Invalid operation")
+                    continue
+                self.running = None
+                if result:
+                    done += 1
+                elif op.t_id not in self.doomed:
+                    # Park before aborting doomed transactions, whose released locks may wake this operation
+                    self.waiters.park(seq, op, self.blocked_on)
+                if self.doomed:
+                    self.abort_doomed()
+                    # Operations woken by the abort may have arrived before this one and end the pass, 
+                    # and no deadlock check runs them before the next instruction under prevention
+                    retry = True
+            retry = retry and bool(self.waiters.heap)
+        return done
     
     def begin(self, t_id: int):
         """
@@ -90,7 +345,7 @@ class TransactionManager(object):
         """
         self.ts += 1
         self.transaction_table[t_id] = Transaction(t_id, self.ts, is_ro=False)
-        print("Transaction {} begins at time stamp {}".format(t_id, self.ts),'\n')
+        self.out.emit(EventType.BEGIN, t_id=t_id, ts=self.ts, ro=False)
     
     def beginRO(self, t_id: int):
         """
@@ -101,7 +356,9 @@ class TransactionManager(object):
         """
         self.ts += 1
         self.transaction_table[t_id] = Transaction(t_id, self.ts, is_ro=True)
-        print("Read-only transaction {} begins at time stamp {}".format(t_id, self.ts),'\n')
+        self.ro_active.pop(t_id, None)
+        self.ro_active[t_id] = self.ts
+        self.out.emit(EventType.BEGIN, t_id=t_id, ts=self.ts, ro=True)
     
     def read_snapshot(self, t_id: int, v_id: int):
         """
@@ -115,18 +372,17 @@ class TransactionManager(object):
             bool: True if the read snapshot operation succeeds, False otherwise
         """
         if not t_id in self.transaction_table:
-            print("Transaction {} aborts".format(t_id), '\n')
+            self.out.emit(EventType.ABORT, t_id=t_id, ts=self.ts, reason=None)
             return False
-        for dm in self.dm_list:
-            if dm.is_running and v_id in dm.data_table:
-                # print("================ TM :: READ_SNAPSHOT ================")
-                # print("v_id :: {}".format(v_id))
-                result = dm.read_snapshot(v_id, self.ts)
-                if result:
-                    self.transaction_table[t_id].visited_sites.append(dm.site_id)
-                    print("Transaction {} reads variable {} of {} on site {} at time stamp {}"
-                          .format(t_id, v_id, dm.data_table[v_id].val_list[0].val, dm.site_id, self.ts),'\n')
-                    return True
+        t = self.transaction_table[t_id]
+        for dm in self.replicas.order(t_id, v_id, self.running_sites(v_id)):
+            # The snapshot is the committed state when the transaction began
+            result = dm.read_snapshot(v_id, t.ts)
+            if result and result.succeed:
+                self.replicas.record(t_id, dm.site_id)
+                t.visited_sites.append(dm.site_id)
+                self.out.emit(EventType.READ, t_id=t_id, v_id=v_id, val=result.val, site=dm.site_id, ts=self.ts)
+                return True
         return False
           
     def read(self, t_id: int, v_id: int):
@@ -141,18 +397,30 @@ class TransactionManager(object):
             bool: True if the read operation succeeds, False otherwise
         """
         if not t_id in self.transaction_table:
-            print("Transaction {} aborts".format(t_id),'\n')
+            self.out.emit(EventType.ABORT, t_id=t_id, ts=self.ts, reason=None)
             return False
-        for dm in self.dm_list:
-            if dm.is_running and v_id in dm.data_table:
-                # print("================ TM :: READ ================")
-                # print("v_id :: {}".format(v_id))
-                result = dm.read(t_id, v_id)
-                if result:
-                    self.transaction_table[t_id].visited_sites.append(dm.site_id)
-                    print("Transaction {} reads variable {} of {} on site {} at time stamp {}"
-                          .format(t_id, v_id, dm.data_table[v_id].val_list[0].val, dm.site_id, self.ts), '\n')
-                    return True
+        t = self.transaction_table[t_id]
+        cached = t.cache.get(v_id)
+        if cached:
+            # The transaction still holds its lock at that site, so no other transaction has committed the variable there
+            self.out.emit(EventType.READ, t_id=t_id, v_id=v_id, val=cached[1], site=cached[0], ts=self.ts)
+            return True
+        for dm in self.replicas.order(t_id, v_id, self.running_sites(v_id)):
+            result = dm.read(t_id, v_id)
+            if result.succeed:
+                self.replicas.record(t_id, dm.site_id)
+                t.visited_sites.append(dm.site_id)
+                # The value read is the transaction's own write if it wrote the variable
+                t.cache[v_id] = (dm.site_id, result.val)
+                self.out.emit(EventType.READ, t_id=t_id, v_id=v_id, val=result.val, site=dm.site_id, ts=self.ts)
+                return True
+            if t_id in self.doomed:
+                return False
+            if dm.data_table[v_id].readable:
+                # The read is queued behind a write lock at this site and waits for it
+                self.out.emit(EventType.WAIT, t_id=t_id, v_id=v_id, site=dm.site_id, ts=self.ts)
+                self.blocked_on = (dm.site_id, v_id)
+                return False
         return False
     
     def write(self, t_id: int, v_id: int, val: int):
@@ -169,14 +437,16 @@ class TransactionManager(object):
         """
         sites = []
         if not t_id in self.transaction_table:
-            print("Transaction {} aborts".format(t_id), '\n')
+            self.out.emit(EventType.ABORT, t_id=t_id, ts=self.ts, reason=None)
             return False
         
-        for dm in [site for site in self.dm_list if site.is_running and site.data_table.get(v_id)]:   
-            # Check if site is running and variable is in the data table
+        for dm in self.running_sites(v_id):
             wlock = dm.acquire_wlock(t_id, v_id)
             if not wlock:
-                print("Write lock conflict found. Transaction {} is waiting.".format(t_id), '\n')
+                if t_id in self.doomed:
+                    return False
+                self.out.emit(EventType.WAIT, t_id=t_id, v_id=v_id, site=dm.site_id, ts=self.ts)
+                self.blocked_on = (dm.site_id, v_id)
                 return False
             sites.append(dm.site_id)
         if not sites:
@@ -187,16 +457,27 @@ class TransactionManager(object):
             # print(target_site.data_table[v_id])
             # print(target_site.data_table[v_id].val)
             self.transaction_table[t_id].visited_sites.append(site_id)
-        print("Transaction {} writes variable {} with value {} to sites {} at time stamp {}."
-              .format(t_id, v_id, val, sites, self.ts), '\n')
+        # A later read reports the written value at the first running site, where the write lock is now held
+        self.transaction_table[t_id].cache[v_id] = (sites[0], val)
+        self.out.emit(EventType.WRITE, t_id=t_id, v_id=v_id, val=val, sites=sites, ts=self.ts)
         return True
         
     def dump(self):
         """
         Dump the state of all sites.
         """
-        for dm in self.dm_list:
-            dm.dump()
+        self.sites.map(DataManager.dump, self.dm_list)
+
+    def check_consistency(self):
+        """
+        Check that the readable replicas on running sites agree on the latest committed value of every variable.
+        Requires the column store.
+
+        Returns:
+            list[str]: Variable IDs whose replicas disagree
+        """
+        stores = [dm.store for dm in self.dm_list if dm.is_running]
+        return ["x" + str(i) for i in inconsistent(stores)]
                 
     def end(self, t_id: int):
         """
@@ -206,29 +487,64 @@ class TransactionManager(object):
             t_id (int): Transaction id
         """
         self.ts += 1
+        if t_id in self.group:
+            self.commit_group()
         if not t_id in self.transaction_table:
-            print("Transaction table does not contains {}".format(t_id),'\n')
+            self.out.emit(EventType.NO_TRANSACTION, t_id=t_id)
             return
         if self.transaction_table[t_id].is_aborted:
+            # Commits decided earlier are emitted first
+            self.commit_group()
             self.abort(t_id, True)
+        elif self.group_window > 1 and not self.has_waiters(t_id):
+            if not self.group:
+                self.group_tick = self.ticks
+            self.group[t_id] = self.ts
         else:
             self.commit(t_id, self.ts)
             
-    def abort(self, t_id: int, fail=False):
+    def has_waiters(self, t_id: int):
+        """
+        Check if an operation may wait for a lock or a committed value of a transaction, 
+        in which case its commit is applied at once instead of being buffered.
+
+        Args:
+            t_id (int): Transaction id
+
+        Returns:
+            bool: True if an operation waits on a variable the transaction used, or an operation is ready to run
+        """
+        waiters = self.waiters
+        if waiters.heap:
+            return True
+        if not waiters.parked:
+            return False
+        for dm in self.dm_list:
+            footprint = dm.footprint.get(t_id)
+            if not footprint:
+                continue
+            locks = waiters.lock_waiters.get(dm.site_id, {})
+            for v_id in footprint:
+                if v_id in locks or v_id in waiters.var_waiters:
+                    return True
+        return False
+
+    def abort(self, t_id: int, fail=False, reason=None):
         """
         Abort a transaction.
         
         Args:
             t_id (int): Transaction id
             fail (bool): True if the site is failed, False otherwise
+            reason (AbortType, optional): Reason of the abort. Defaults to site failure or deadlock depending on fail.
         """
-        for dm in self.dm_list:
-            dm.abort(t_id)
+        self.sites.map(lambda dm: dm.abort(t_id), self.dm_list)
         del self.transaction_table[t_id]
-        if fail:
-            print("Transaction {} aborts due to site failure at time stamp {} ".format(t_id, self.ts),'\n')
-        else:
-            print("Transaction {} aborts due to deadlock at time stamp {} ".format(t_id, self.ts),'\n')
+        self.waiters.drop(t_id)
+        self.replicas.forget(t_id)
+        self.ro_active.pop(t_id, None)
+        reason = reason or (AbortType.SITE_FAILURE if fail else AbortType.DEADLOCK)
+        self.out.emit(EventType.ABORT, t_id=t_id, ts=self.ts, reason=reason)
 
     def commit(self, t_id: int, ts: int):
         """
@@ -238,115 +554,255 @@ class TransactionManager(object):
             t_id (int): Transaction id
             ts (int): Time stamp
         """
-        for dm in self.dm_list:
-            dm.commit(t_id, ts)
-        del self.transaction_table[t_id]
-        print("Transaction {} commits at time stamp {}".format(t_id, self.ts),'\n')
+        self.group[t_id] = ts
+        self.commit_group()
+
+    def commit_group(self):
+        """
+        Apply the buffered commits in the order they were decided, with one pass over the sites for the whole group.
+        """
+        group, self.group = self.group, {}
+        if not group:
+            return
+        for t_id in group:
+            self.ro_active.pop(t_id, None)
+        horizon = self.version_horizon() if self.gc == GCMode.COMMIT else None
+        entries = list(group.items())
+        self.sites.map(lambda dm: dm.commit_group(entries, horizon), self.dm_list)
+        for t_id, ts in entries:
+            del self.transaction_table[t_id]
+            # A transaction may end while one of its operations is still waiting
+            self.waiters.drop(t_id)
+            self.replicas.forget(t_id)
+            self.commits += 1
+            if self.gc == GCMode.SWEEP and self.commits % self.gc_interval == 0:
+                self.collect_versions()
+            self.out.emit(EventType.COMMIT, t_id=t_id, ts=ts)
         
-    def recover(self, site_id: str):
+    def version_horizon(self):
+        """
+        Find the oldest timestamp a read-only transaction can still read at.
+        Every committed value older than the latest one at or before this timestamp can be dropped.
+
+        Returns:
+            int: Begin timestamp of the oldest active read-only transaction, or the current timestamp if there is none
+        """
+        return next(iter(self.ro_active.values()), self.ts)
+
+    def collect_versions(self):
+        """
+        Sweep every site and drop committed values no read-only transaction can read any more.
+        """
+        horizon = self.version_horizon()
+        for dm in self.dm_list:
+            dm.collect_versions(horizon)
+
+    def recover(self, site_id: int):
         """
         Recover a site.
         
         Args:
-            site_id (str): Site id
+            site_id (int): Site id
         """
-        if not self.dm_list[int(site_id) - 1]:
-            print("Site {} is already down".format(site_id))
+        site_id = int(site_id)
+        if not self.dm_list[site_id - 1]:
+            self.out.emit(EventType.ERROR, message="Site {} is already down".format(site_id))
         self.ts += 1
-        self.dm_list[int(site_id) - 1].recover(self.ts)
-        print("Site {} recovers at time stamp {}".format(site_id, self.ts),'\n')
+        self.dm_list[site_id - 1].recover(self.ts)
+        self.site_up[site_id] = 1
+        self.waiters.wake_recovered(self.dm_list[site_id - 1])
+        self.out.emit(EventType.RECOVER, site=site_id, ts=self.ts)
+        # Reads may now go to the recovered site: in site order only ahead of a cached site after it, 
+        # with the other selectors ahead of any cached site
+        data_table = self.dm_list[site_id - 1].data_table
+        in_order = self.replica_type == ReplicaType.FIRST
+        for v in self.transaction_table.values():
+            if v.cache:
+                v.cache = {k: c for k, c in v.cache.items() if in_order and c[0] < site_id or k not in data_table}
             
-    def fail(self, site_id: str):
+    def fail(self, site_id: int):
         """
         Fail a site.
         
         Args:
-            site_id (str): Site id
+            site_id (int): Site id
         """
-        if not self.dm_list[int(site_id) - 1].is_running:
-            print("Site {} is already down".format(site_id))
+        site_id = int(site_id)
+        if not self.dm_list[site_id - 1].is_running:
+            self.out.emit(EventType.ERROR, message="Site {} is already down".format(site_id))
             return
         self.ts += 1
-        self.dm_list[int(site_id) - 1].fail(self.ts)    
-        print("Site {} fails".format(site_id),'\n')
-        for k, v in self.transaction_table.items():
+        self.dm_list[site_id - 1].fail(self.ts)    
+        self.site_up[site_id] = 0
+        self.waiters.wake_site(site_id)
+        self.out.emit(EventType.FAIL, site=site_id, ts=self.ts)
+        # Locks at the failed site are lost, so cached reads from it are dropped
+        for v in self.transaction_table.values():
+            if v.cache and site_id in v.visited_sites:
+                v.cache = {k: c for k, c in v.cache.items() if c[0] != site_id}
+        # Every read-write transaction that accessed the site aborts when it ends
+        for v in self.transaction_table.values():
             if not v.is_ro and not v.is_aborted and site_id in v.visited_sites:
                 v.is_aborted = True
-                return
         
-    def init_graph(self, dm_list):
+    def prevent(self, t_id: int, blockers: set):
         """
-        Initialize a blocking graph for deadlock detection.
+        Decide a lock conflict with the deadlock prevention policy, using the begin timestamps of the transactions.
+        With wait-die, a requester younger than any blocker is doomed. With wound-wait, the blockers younger 
+        than the requester are doomed. Doomed transactions are aborted once the current operation returns.
 
         Args:
-            dm_list (list[DataManager]): List of data managers
+            t_id (int): Transaction ID of the requester
+            blockers (set): Transaction IDs the requester would wait for
+
+        Returns:
+            bool: True if the requester may wait, False if it must abort
+        """
+        table = self.transaction_table
+        ts = table[t_id].ts
+        if self.policy == PolicyType.WAIT_DIE:
+            if any(table[b].ts < ts for b in blockers):
+                self.doomed[t_id] = AbortType.WAIT_DIE
+                return False
+            return True
+        for b in sorted(blockers, key=lambda k: table[k].ts, reverse=True):
+            # A transaction whose commit is buffered is not wounded
+            if table[b].ts > ts and b not in self.group:
+                self.doomed[b] = AbortType.WOUND_WAIT
+        return True
+
+    def abort_doomed(self):
+        """
+        Abort the transactions doomed by the deadlock prevention policy.
+        """
+        doomed, self.doomed = self.doomed, {}
+        for t_id, reason in doomed.items():
+            if t_id in self.transaction_table:
+                self.abort(t_id, reason=reason)
+
+    def init_graph(self):
+        """
+        Bring the blocking graph up to date with the lock managers changed since the last tick.
 
         Returns:
             graph (dict): Blocking graph
         """
-        graph = defaultdict(set)
-        for dm in [x for x in dm_list if x.is_running]:
-            g = dm.init_block_graph()
-            for k, v in g.items():
-                graph[k].update(v)
-        return graph 
+        return self.graph.refresh(self.sites if self.sites.pool else None)
 
-    def is_cyclic(self, src: int, dest: int, visited: defaultdict, graph: defaultdict):
+    def find_components(self, nodes, graph: defaultdict):
         """
-        Check if there is a cycle in the blocking graph using DFS algorithm.
-    
+        Find the strongly connected components of the blocking graph restricted to the given nodes,
+        using an iterative version of Tarjan's algorithm so that long wait chains do not hit the recursion limit.
+
         Args:
-            src (int): Source node transaction ID
-            dest (int): Destination node transaction ID
-            visited (defaultdict): Visited nodes
+            nodes (iterable): Transaction IDs the search is restricted to
             graph (defaultdict): Blocking graph
 
         Returns:
-            bool: True if there is a cycle, False otherwise
-        """
-        visited[src] = True
-        for node in graph[src]:
-            if node == dest:
-                return True
-            if not visited[node]:
-                if self.is_cyclic(node, dest, visited, graph):
-                    return True
-        return False
+            list[list]: Strongly connected components with more than one transaction
+        """
+        nodes = set(nodes)
+        index = {}          # Discovery order of each node
+        low = {}            # Smallest discovery order reachable from each node
+        stack = []          # Nodes of the components being built
+        on_stack = set()
+        components = []
+        counter = 0
+
+        for root in nodes:
+            if root in index:
+                continue
+            work = [(root, iter(graph.get(root, ())))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, edges = work[-1]
+                for nxt in edges:
+                    if nxt not in nodes:
+                        continue
+                    if nxt not in index:
+                        index[nxt] = low[nxt] = counter
+                        counter += 1
+                        stack.append(nxt)
+                        on_stack.add(nxt)
+                        work.append((nxt, iter(graph.get(nxt, ()))))
+                        break
+                    if nxt in on_stack:
+                        low[node] = min(low[node], index[nxt])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1:
+                            components.append(component)
+        return components
 
     def find_cycle(self, table: dict, graph: defaultdict):
         """
-        Detect the cycle in the blocking graph and return the youngest transaction ID.
+        Detect every cycle in the blocking graph and return the youngest transaction ID of each one.
+        After a victim is chosen, only the rest of its component is searched again for remaining cycles.
 
         Args:
             table (dict): Transaction table
             graph (defaultdict): Blocking graph
 
         Returns:
-            int: Youngest transaction ID
-        """
-        t_ts = -1
-        t_id = None
-        
-        for k, v in list(graph.items()):
-            visited = defaultdict(bool)
-            if self.is_cyclic(k, k, visited, graph):
-                if table[k].ts > t_ts:
-                    ts = table[k].ts
-                t_id = k
-        return t_id
+            list: Youngest transaction IDs to abort, youngest first
+        """
+        victims = []
+        components = self.find_components(list(graph), graph)
+        while components:
+            component = components.pop()
+            t_id = max(component, key=lambda k: table[k].ts)
+            victims.append(t_id)
+            component.remove(t_id)
+            components.extend(self.find_components(component, graph))
+        return sorted(victims, key=lambda k: table[k].ts, reverse=True)
 
     def check_deadlock(self):
         """
-        Check if there is a deadlock by detecting a cycle in the blocking graph.
+        Check if there is a deadlock by detecting cycles in the blocking graph.
+        The youngest transaction of every cycle is aborted in the same tick.
+        Under a deadlock prevention policy there is no graph and nothing is checked.
+        Detection is skipped if no wait edge appeared since the last detection. Otherwise it runs once detect_interval 
+        ticks have passed since the last detection, once the new edge is detect_age ticks old, or when the last tick stalled.
 
         Returns:
             bool: True if there is a deadlock, False otherwise
         """
-        graph = self.init_graph(self.dm_list)
-        cyclic = self.find_cycle(self.transaction_table, graph)
-        if cyclic is None:
+        if not self.graph:
             return False
-        else:
-            print("Deadlock detected. Abort transaction {}".format(cyclic))
-            self.abort(cyclic)
-            return True
+        graph = self.init_graph()
+        if not self.graph.changed:
+            return False
+        if self.waiting_since is None:
+            self.waiting_since = self.ticks
+        due = (self.stalled or self.ticks - self.last_detection >= self.detect_interval
+               or self.detect_age is not None and self.ticks - self.waiting_since >= self.detect_age)
+        if not due:
+            return False
+        self.graph.changed = False
+        self.waiting_since = None
+        self.last_detection = self.ticks
+        if self.group:
+            # Buffered commits release their locks before cycles are looked for
+            self.commit_group()
+            graph = self.init_graph()
+        victims = self.find_cycle(self.transaction_table, graph)
+        if not victims:
+            return False
+        for t_id in victims:
+            self.out.emit(EventType.DEADLOCK, t_id=t_id, ts=self.ts)
+            self.abort(t_id)
+        return True
@@ -0,0 +1,194 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import heapq
+from collections import defaultdict
+from itertools import count
+
+class WaiterIndex(object):
+    """
+    Waiter index parks blocked read/write operations under the event they are waiting for,
+    so the transaction manager only retries an operation when something it depends on has changed.
+    An operation is either waiting on the lock of a variable at a site, or waiting for any copy of a variable to become available.
+    Ready operations are retried in arrival order.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing an empty waiter index.
+        """
+        self.seq = count(1)                                         # Arrival order of operations
+        self.heap = []                                              # Ready operations ordered by arrival
+        self.lock_waiters = defaultdict(lambda: defaultdict(list))  # Site -> variable -> operations waiting on its lock
+        self.var_waiters = defaultdict(list)                        # Variable -> operations waiting for an available copy
+        self.parked = 0                                             # Number of parked operations
+
+    def __getstate__(self):
+        """
+        Get the state to snapshot. The arrival counter and the nested defaultdict are stored as plain values.
+
+        Returns:
+            dict: Attributes of the waiter index
+        """
+        state = self.__dict__.copy()
+        seq = next(self.seq)
+        self.seq = count(seq)
+        state['seq'] = seq
+        state['lock_waiters'] = {site: dict(waiters) for site, waiters in self.lock_waiters.items()}
+        return state
+
+    def __setstate__(self, state: dict):
+        """
+        Restore the state from a snapshot.
+
+        Args:
+            state (dict): Attributes of the waiter index
+        """
+        lock_waiters = state.pop('lock_waiters')
+        self.__dict__.update(state)
+        self.seq = count(state['seq'])
+        self.lock_waiters = defaultdict(lambda: defaultdict(list))
+        for site, waiters in lock_waiters.items():
+            self.lock_waiters[site].update(waiters)
+
+    def add(self, op):
+        """
+        Add a new operation that is ready to run.
+
+        Args:
+            op (Operation): Operation to run
+        """
+        heapq.heappush(self.heap, (next(self.seq), op))
+
+    def pending(self):
+        """
+        Count the operations that have not completed yet, parked or waiting to be retried.
+
+        Returns:
+            int: Number of pending operations
+        """
+        return self.parked + len(self.heap)
+
+    def drop(self, t_id):
+        """
+        Remove the parked and ready operations of a transaction that aborted or committed, 
+        so they are no longer counted as pending.
+
+        Args:
+            t_id (str): Transaction ID
+        """
+        if self.heap:
+            heap = [entry for entry in self.heap if entry[1].t_id != t_id]
+            if len(heap) != len(self.heap):
+                heapq.heapify(heap)
+                # The heap may be iterated by ready() while a transaction aborts
+                self.heap[:] = heap
+        if not self.parked:
+            return
+        for waiters in [self.var_waiters] + list(self.lock_waiters.values()):
+            for key in [k for k, entries in waiters.items() if any(op.t_id == t_id for _, op in entries)]:
+                entries = [entry for entry in waiters[key] if entry[1].t_id != t_id]
+                self.parked -= len(waiters[key]) - len(entries)
+                if entries:
+                    waiters[key] = entries
+                else:
+                    del waiters[key]
+
+    def ready(self, drain: bool=False):
+        """
+        Yield ready operations in arrival order.
+        Operations woken up while iterating are yielded in the same pass only if they arrived later
+        than the operation being run, otherwise they wait for the next pass.
+
+        Args:
+            drain (bool, optional): If False, the pass ends at the first such operation. If True, it is set aside 
+                and every later ready operation is still yielded once. Defaults to False.
+
+        Yields:
+            tuple: Arrival order and operation
+        """
+        last = 0
+        deferred = []   # Operations woken up during the pass that arrived before the last yielded one
+        try:
+            while self.heap:
+                if self.heap[0][0] <= last:
+                    if not drain:
+                        break
+                    deferred.append(heapq.heappop(self.heap))
+                    continue
+                entry = heapq.heappop(self.heap)
+                last = entry[0]
+                yield entry
+        finally:
+            for entry in deferred:
+                heapq.heappush(self.heap, entry)
+
+    def park(self, seq: int, op, key):
+        """
+        Park a blocked operation until the event it is waiting for happens.
+
+        Args:
+            seq (int): Arrival order of the operation
+            op (Operation): Blocked operation
+            key (tuple or str): (site ID, variable ID) of the lock it waits on, or the variable ID if no copy is available
+        """
+        if isinstance(key, tuple):
+            site_id, v_id = key
+            self.lock_waiters[site_id][v_id].append((seq, op))
+        else:
+            self.var_waiters[key].append((seq, op))
+        self.parked += 1
+
+    def wake(self, entries):
+        """
+        Move parked operations back to the ready heap.
+
+        Args:
+            entries (list): Parked (arrival order, operation) pairs
+        """
+        self.parked -= len(entries)
+        for entry in entries:
+            heapq.heappush(self.heap, entry)
+
+    def wake_lock(self, site_id: int, v_id: str):
+        """
+        Wake up operations waiting on the lock of a variable at a site.
+
+        Args:
+            site_id (int): Site ID
+            v_id (str): Variable ID
+        """
+        waiters = self.lock_waiters.get(site_id)
+        if waiters and v_id in waiters:
+            self.wake(waiters.pop(v_id))
+
+    def wake_site(self, site_id: int):
+        """
+        Wake up every operation waiting on a lock at a site, e.g. when the site fails and its lock table is erased.
+
+        Args:
+            site_id (int): Site ID
+        """
+        for entries in self.lock_waiters.pop(site_id, {}).values():
+            self.wake(entries)
+
+    def wake_variable(self, v_id: str):
+        """
+        Wake up operations waiting for a copy of a variable to become available.
+
+        Args:
+            v_id (str): Variable ID
+        """
+        if v_id in self.var_waiters:
+            self.wake(self.var_waiters.pop(v_id))
+
+    def wake_recovered(self, dm):
+        """
+        Wake up operations waiting for a variable stored at a recovered site.
+
+        Args:
+            dm (DataManager): Data manager of the recovered site
+        """
+        for v_id in [v for v in self.var_waiters if v in dm.data_table]:
+            self.wake(self.var_waiters.pop(v_id))
@@ -0,0 +1,124 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+from collections import defaultdict
+
+class WaitsForGraph(object):
+    """
+    Waits-for graph maintained incrementally by the transaction manager.
+    Data managers mark a lock manager as dirty whenever its current lock or lock queue changes,
+    and only the dirty lock managers are re-examined when the graph is refreshed.
+    Each edge keeps a count of the lock managers contributing it, so an edge disappears
+    only when no lock manager on any site still produces it.
+    """
+    def __init__(self):
+        """
+        Constructor for initializing an empty waits-for graph.
+        """
+        self.graph = defaultdict(set)   # Adjacency list: waiting transaction -> blocking transactions
+        self.count = defaultdict(int)   # Number of lock managers contributing each edge
+        self.site_edges = {}            # Edges contributed by each lock manager: site -> v_id -> edges
+        self.dirty = {}                 # Lock managers changed since the last refresh: (site, v_id) -> data manager
+        self.changed = False            # Flag to indicate whether an edge was added since the last check
+
+    def mark(self, dm, v_id: str):
+        """
+        Mark a lock manager as changed so that its edges are recomputed on the next refresh.
+
+        Args:
+            dm (DataManager): Data manager owning the lock manager
+            v_id (str): Variable ID
+        """
+        self.dirty[(dm.site_id, v_id)] = dm
+
+    def drop_site(self, site_id: int):
+        """
+        Remove every edge contributed by a site, e.g. when the site fails and its lock table is erased.
+
+        Args:
+            site_id (int): Site ID
+        """
+        for v_id, edges in self.site_edges.pop(site_id, {}).items():
+            self.dirty.pop((site_id, v_id), None)
+            for edge in edges:
+                self.remove_edge(edge)
+
+    def add_edge(self, edge: tuple):
+        """
+        Add one contribution of an edge to the graph.
+
+        Args:
+            edge (tuple): Waiting transaction ID and blocking transaction ID
+        """
+        if not self.count[edge]:
+            self.graph[edge[0]].add(edge[1])
+            self.changed = True
+        self.count[edge] += 1
+
+    def remove_edge(self, edge: tuple):
+        """
+        Remove one contribution of an edge from the graph.
+
+        Args:
+            edge (tuple): Waiting transaction ID and blocking transaction ID
+        """
+        self.count[edge] -= 1
+        if self.count[edge]:
+            return
+        del self.count[edge]
+        waiter, holder = edge
+        self.graph[waiter].discard(holder)
+        if not self.graph[waiter]:
+            del self.graph[waiter]
+
+    def fragments(self, dirty: dict, executor=None):
+        """
+        Compute the edges of the dirty lock managers, one batch per site if a site executor is given.
+
+        Args:
+            dirty (dict): Dirty lock managers: (site, v_id) -> data manager
+            executor (SiteExecutor, optional): Site executor running the sites' work
+
+        Returns:
+            dict: (site, v_id) -> edges of the lock manager
+        """
+        if executor is None:
+            return {key: dm.block_edges(key[1]) if dm.is_running else set() for key, dm in dirty.items()}
+        by_site = {}
+        for (site_id, v_id), dm in dirty.items():
+            by_site.setdefault(dm, []).append(v_id)
+        def site_fragment(dm):
+            return {(dm.site_id, v_id): dm.block_edges(v_id) if dm.is_running else set() for v_id in by_site[dm]}
+        fragments = {}
+        for fragment in executor.map(site_fragment, list(by_site)):
+            fragments.update(fragment)
+        return fragments
+
+    def refresh(self, executor=None):
+        """
+        Recompute the edges of every dirty lock manager and apply the difference to the graph.
+        The difference is applied in the order the lock managers were marked.
+
+        Args:
+            executor (SiteExecutor, optional): Site executor computing the edges of each site
+
+        Returns:
+            graph (dict): Blocking graph
+        """
+        dirty, self.dirty = self.dirty, {}
+        fragments = self.fragments(dirty, executor)
+        for site_id, v_id in dirty:
+            edges = self.site_edges.setdefault(site_id, {})
+            old = edges.get(v_id, set())
+            new = fragments[(site_id, v_id)]
+            for edge in old - new:
+                self.remove_edge(edge)
+            for edge in new - old:
+                self.add_edge(edge)
+            if new:
+                edges[v_id] = new
+            else:
+                edges.pop(v_id, None)
+        return self.graph
@@ -0,0 +1,147 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import argparse
+import random
+import sys
+from itertools import accumulate
+
+class WorkloadGenerator(object):
+    """
+    Workload generator writes synthetic traces in the input grammar (begin/beginRO/R/W/end/fail/recover/dump).
+    Transactions are interleaved: up to `concurrency` transactions are active at once, and each tick one of them
+    either issues its next read or write or ends.
+
+    Args:
+        transactions (int): Number of transactions
+        variables (int): Number of variables (x1, ..., xn)
+        sites (int): Number of sites
+        concurrency (int): Maximum number of active transactions
+        ops (int): Mean number of reads and writes per transaction
+        write_ratio (float): Fraction of operations of read-write transactions that are writes
+        ro_fraction (float): Fraction of transactions that are read-only
+        skew (str): Key distribution: uniform, zipf, or hotspot
+        zipf_s (float): Exponent of the Zipf distribution
+        hot_keys (float): Fraction of the variables that are hot in the hotspot distribution
+        hot_access (float): Fraction of the accesses that go to hot variables in the hotspot distribution
+        fail_every (int): Ticks between two failure storms, 0 for no failures
+        storm_size (int): Number of sites failed in each storm
+        recover_after (int): Ticks after which the sites of a storm recover
+        seed (int): Random seed
+    """
+    SKEWS = ('uniform', 'zipf', 'hotspot')
+
+    def __init__(self, transactions: int=1000, variables: int=20, sites: int=10, concurrency: int=10, ops: int=5,
+                 write_ratio: float=0.5, ro_fraction: float=0.1, skew: str='uniform', zipf_s: float=1.1,
+                 hot_keys: float=0.1, hot_access: float=0.9, fail_every: int=0, storm_size: int=1,
+                 recover_after: int=10, seed: int=0):
+        """
+        Constructor for initializing a workload generator.
+        """
+        if skew not in self.SKEWS:
+            raise ValueError("Unknown skew {}".format(skew))
+        self.transactions = transactions
+        self.variables = variables
+        self.sites = sites
+        self.concurrency = concurrency
+        self.ops = ops
+        self.write_ratio = write_ratio
+        self.ro_fraction = ro_fraction
+        self.skew = skew
+        self.hot = max(1, int(variables * hot_keys))
+        self.hot_access = hot_access
+        self.fail_every = fail_every
+        self.storm_size = min(storm_size, sites)
+        self.recover_after = recover_after
+        self.random = random.Random(seed)
+        # Cumulative weights of the Zipf distribution over x1, ..., xn
+        self.zipf = list(accumulate(1 / k ** zipf_s for k in range(1, variables + 1))) if skew == 'zipf' else None
+
+    def key(self):
+        """
+        Draw a variable from the key distribution.
+
+        Returns:
+            str: Variable ID
+        """
+        if self.skew == 'zipf':
+            i = self.random.choices(range(1, self.variables + 1), cum_weights=self.zipf)[0]
+        elif self.skew == 'hotspot' and self.hot < self.variables:
+            if self.random.random() < self.hot_access:
+                i = self.random.randint(1, self.hot)
+            else:
+                i = self.random.randint(self.hot + 1, self.variables)
+        else:
+            i = self.random.randint(1, self.variables)
+        return "x{}".format(i)
+
+    def lines(self):
+        """
+        Generate the trace line by line.
+
+        Yields:
+            str: Instruction line
+        """
+        rand = self.random
+        begun = 0
+        active = []         # [transaction ID, read-only flag, remaining operations]
+        down = {}           # Failed site -> tick of recovery
+        tick = 0
+        while begun < self.transactions or active:
+            tick += 1
+            for site in [s for s, t in down.items() if t <= tick]:
+                del down[site]
+                yield "recover({})".format(site)
+            if self.fail_every and tick % self.fail_every == 0:
+                up = [s for s in range(1, self.sites + 1) if s not in down]
+                for site in rand.sample(up, min(self.storm_size, len(up))):
+                    down[site] = tick + self.recover_after
+                    yield "fail({})".format(site)
+            if begun < self.transactions and (len(active) < self.concurrency or not active):
+                begun += 1
+                ro = rand.random() < self.ro_fraction
+                active.append(["T{}".format(begun), ro, max(1, int(rand.expovariate(1 / self.ops)))])
+                yield "{}(T{})".format("beginRO" if ro else "begin", begun)
+                continue
+            k = rand.randrange(len(active))
+            t = active[k]
+            if not t[2]:
+                active[k] = active[-1]
+                active.pop()
+                yield "end({})".format(t[0])
+                continue
+            t[2] -= 1
+            if not t[1] and rand.random() < self.write_ratio:
+                yield "W({},{},{})".format(t[0], self.key(), rand.randint(0, 9999))
+            else:
+                yield "R({},{})".format(t[0], self.key())
+        for site in down:
+            yield "recover({})".format(site)
+
+if __name__ == '__main__':
+    """
+    Write a synthetic trace to standard output.
+    """
+    parser = argparse.ArgumentParser(description='Synthetic workload generator')
+    parser.add_argument('--transactions', type=int, default=1000, help='number of transactions (default 1000)')
+    parser.add_argument('--variables', type=int, default=20, help='number of variables (default 20)')
+    parser.add_argument('--sites', type=int, default=10, help='number of sites (default 10)')
+    parser.add_argument('--concurrency', type=int, default=10, help='maximum active transactions (default 10)')
+    parser.add_argument('--ops', type=int, default=5, help='mean operations per transaction (default 5)')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='fraction of writes (default 0.5)')
+    parser.add_argument('--ro-fraction', type=float, default=0.1, help='fraction of read-only transactions (default 0.1)')
+    parser.add_argument('--skew', choices=WorkloadGenerator.SKEWS, default='uniform', help='key distribution (default uniform)')
+    parser.add_argument('--zipf-s', type=float, default=1.1, help='Zipf exponent (default 1.1)')
+    parser.add_argument('--hot-keys', type=float, default=0.1, help='fraction of hot variables (default 0.1)')
+    parser.add_argument('--hot-access', type=float, default=0.9, help='fraction of accesses to hot variables (default 0.9)')
+    parser.add_argument('--fail-every', type=int, default=0, help='ticks between failure storms, 0 for none (default 0)')
+    parser.add_argument('--storm-size', type=int, default=1, help='sites failed per storm (default 1)')
+    parser.add_argument('--recover-after', type=int, default=10, help='ticks until failed sites recover (default 10)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    options = parser.parse_args()
+
+    generator = WorkloadGenerator(**vars(options))
+    for line in generator.lines():
+        sys.stdout.write(line + "\n")
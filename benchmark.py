@@ -0,0 +1,511 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from Config import *
+from EventSink import CountingSink
+from InputParser import parse
+from Server import Server, ServerSink, serve
+from TransactionManager import TransactionManager
+from WorkloadGenerator import WorkloadGenerator
+try:
+    import resource
+except ImportError:     # Not available on Windows
+    resource = None
+
+def legacy(cls):
+    """
+    Build a plain class with a per-instance __dict__ and the same constructor as a slotted record,
+    to compare against the layout the records had before they were slotted.
+
+    Args:
+        cls (type): Slotted record class
+
+    Returns:
+        type: Equivalent class without __slots__
+    """
+    return type('Legacy' + cls.__name__, (object,), {'__init__': cls.__init__})
+
+def traced(build, n: int):
+    """
+    Measure the memory allocated by building n objects.
+
+    Args:
+        build (callable): Function building one object from its index
+        n (int): Number of objects
+
+    Returns:
+        int: Allocated bytes per object
+    """
+    objects = [None] * n
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        objects[i] = build(i)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+def memory(args):
+    """
+    Compare the memory of the slotted records against plain classes, per object and per 1M committed versions.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    n = args.count
+    records = [
+        ('Transaction', lambda c, i: c('T1', i, False)),
+        ('Operation', lambda c, i: c('W', 'T1', 'x2', i)),
+        ('Variable', lambda c, i: c('x2', Commit(i, 0), True)),
+        ('Commit', lambda c, i: c(i, i)),
+        ('Temp', lambda c, i: c(i, 'T1')),
+        ('RLock', lambda c, i: c('T1', 'x2')),
+        ('WLock', lambda c, i: c('T1', 'x2')),
+        ('QLock', lambda c, i: c('T1', 'x2', READ_LOCK)),
+    ]
+    print("{:<12} {:>10} {:>10} {:>8}".format('record', 'dict (B)', 'slots (B)', 'saved'))
+    for name, build in records:
+        cls = globals()[name]
+        old_cls = legacy(cls)
+        old = traced(lambda i: build(old_cls, i), n)
+        new = traced(lambda i: build(cls, i), n)
+        print("{:<12} {:>10.1f} {:>10.1f} {:>7.0%}".format(name, old, new, 1 - new / old))
+
+    # Versions: the old layout prepended dict-based commits, the new one appends slotted commits plus their timestamps
+    versions = args.versions
+    LegacyCommit = legacy(Commit)
+    def old_chain():
+        val_list = []
+        for i in range(versions):
+            val_list.append(LegacyCommit(i, i))
+        return val_list
+    def new_chain():
+        var = Variable('x2', Commit(0, 0), True)
+        for i in range(1, versions):
+            var.add_version(Commit(i, i))
+        return var
+    old = traced(lambda i: old_chain(), 1) * 1000000 / versions
+    new = traced(lambda i: new_chain(), 1) * 1000000 / versions
+    print("{:<12} {:>9.1f}M {:>9.1f}M {:>7.0%}".format('1M versions', old / 2**20, new / 2**20, 1 - new / old))
+
+def peak_memory():
+    """
+    Get the peak resident set size of the process.
+
+    Returns:
+        float: Peak memory in MiB, or None if it cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def workload(args):
+    """
+    Get the instructions of a throughput run, read from a trace file or generated.
+
+    Args:
+        args (Namespace): Command line arguments
+
+    Returns:
+        list[Instruction]: Parsed instructions
+    """
+    if args.trace:
+        with open(args.trace) as f:
+            return list(parse(f))
+    generator = WorkloadGenerator(transactions=args.transactions, variables=args.variables, sites=args.sites,
+                                  concurrency=args.concurrency, ops=args.ops, write_ratio=args.write_ratio,
+                                  ro_fraction=args.ro_fraction, skew=args.skew, fail_every=args.fail_every,
+                                  storm_size=args.storm_size, recover_after=args.recover_after, seed=args.seed)
+    return list(parse(generator.lines()))
+
+def drive(instructions: list, topology: Topology, **options):
+    """
+    Run instructions through a transaction manager whose events are counted instead of written.
+
+    Args:
+        instructions (list[Instruction]): Parsed instructions
+        topology (Topology): Topology of the database
+        **options: Keyword arguments of the transaction manager
+
+    Returns:
+        tuple: Elapsed seconds, the counting sink, and the transaction manager
+    """
+    sink = CountingSink()
+    tm = TransactionManager(topology, out=sink, **options)
+    start = time.perf_counter()
+    for instruction in instructions:
+        tm.execute(instruction)
+    tm.commit_group()
+    return time.perf_counter() - start, sink, tm
+
+def report(name: str, ops: int, elapsed: float, sink: CountingSink):
+    """
+    Print one line of throughput results.
+
+    Args:
+        name (str): Name of the run
+        ops (int): Number of instructions
+        elapsed (float): Elapsed seconds
+        sink (CountingSink): Counted events of the run
+    """
+    commits = sink.counts[EventType.COMMIT]
+    aborts = sink.counts[EventType.ABORT]
+    ended = commits + aborts
+    print("{:<12} {:>8} {:>9.3f} {:>12.0f} {:>12.0f} {:>8} {:>8} {:>7.1%}".format(
+        name, ops, elapsed, ops / elapsed, commits / elapsed, commits, aborts, aborts / ended if ended else 0))
+
+def throughput(args):
+    """
+    Measure operations per second, commits per second, and abort rate on a synthetic or recorded workload.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    instructions = workload(args)
+    topology = Topology(args.sites, args.variables)
+    print("{:<12} {:>8} {:>9} {:>12} {:>12} {:>8} {:>8} {:>7}".format(
+        'run', 'ops', 'time (s)', 'ops/s', 'commits/s', 'commits', 'aborts', 'aborted'))
+    for k in range(args.repeat):
+        elapsed, sink, tm = drive(instructions, topology, gc=args.gc, columnar=args.columnar, policy=args.policy,
+                                  group_window=args.group_window)
+        report('run {}'.format(k + 1), len(instructions), elapsed, sink)
+    peak = peak_memory()
+    if peak is not None:
+        print("peak memory {:.1f} MiB".format(peak))
+
+def policies(args):
+    """
+    Compare throughput and abort rate of deadlock detection, wait-die, and wound-wait on the same workload.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    instructions = workload(args)
+    topology = Topology(args.sites, args.variables)
+    print("{:<12} {:>8} {:>9} {:>12} {:>12} {:>8} {:>8} {:>7}".format(
+        'policy', 'ops', 'time (s)', 'ops/s', 'commits/s', 'commits', 'aborts', 'aborted'))
+    for policy in PolicyType:
+        best = None
+        for k in range(args.repeat):
+            elapsed, sink, tm = drive(instructions, topology, policy=policy)
+            best = min(best or elapsed, elapsed)
+        report(policy.value, len(instructions), best, sink)
+
+def replicas(args):
+    """
+    Compare the replica selection policies of reads on the same workload: throughput, reads served by each site,
+    and the peak number of locks queued on one variable at one site.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    instructions = workload(args)
+    topology = Topology(args.sites, args.variables)
+    print("{:<14} {:>9} {:>12} {:>8} {:>8} {:>10}  {}".format(
+        'replicas', 'time (s)', 'ops/s', 'commits', 'aborts', 'max queue', 'reads per site'))
+    for kind in ReplicaType:
+        # Sample the longest lock queue after every instruction
+        sink = CountingSink()
+        tm = TransactionManager(topology, out=sink, replicas=kind)
+        longest = 0
+        start = time.perf_counter()
+        for instruction in instructions:
+            tm.execute(instruction)
+            for dm in tm.dm_list:
+                for lm in dm.lock_table.values():
+                    longest = max(longest, len(lm.lock_queue))
+        elapsed = time.perf_counter() - start
+        reads = tm.replicas.distribution()
+        print("{:<14} {:>9.3f} {:>12.0f} {:>8} {:>8} {:>10}  {}".format(
+            kind.value, elapsed, len(instructions) / elapsed, sink.counts[EventType.COMMIT], 
+            sink.counts[EventType.ABORT], longest, " ".join(str(reads.get(k, 0)) for k in range(1, args.sites + 1))))
+
+async def client(k: int, args, path: str, totals: dict):
+    """
+    Run the transactions of one client over a Unix socket, waiting for each response before the next request.
+
+    Args:
+        k (int): Client number
+        args (Namespace): Command line arguments
+        path (str): Unix socket path of the server
+        totals (dict): Counts of requests, commits, and aborts over all clients
+    """
+    rand = random.Random(args.seed * 1000 + k)
+    reader, writer = await asyncio.open_unix_connection(path)
+
+    async def request(line):
+        writer.write((line + "\n").encode())
+        response = json.loads(await reader.readline())
+        totals['requests'] += 1
+        return [e['event'] for e in response['events']]
+
+    for j in range(args.transactions):
+        t_id = "C{}T{}".format(k, j)
+        await request("begin({})".format(t_id))
+        aborted = False
+        for _ in range(rand.randint(1, 2 * args.ops - 1)):
+            v_id = "x{}".format(rand.randint(1, args.variables))
+            if rand.random() < args.write_ratio:
+                events = await request("W({},{},{})".format(t_id, v_id, rand.randint(0, 9999)))
+            else:
+                events = await request("R({},{})".format(t_id, v_id))
+            if 'abort' in events:
+                aborted = True
+                break
+        if aborted:
+            totals['aborts'] += 1
+            continue
+        events = await request("end({})".format(t_id))
+        totals['commits' if 'commit' in events else 'aborts'] += 1
+    writer.write(b"quit\n")
+    await writer.drain()
+    writer.close()
+
+def service(args):
+    """
+    Measure end-to-end throughput and latency of the service with concurrent clients on a Unix socket.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    sink = ServerSink()
+    tm = TransactionManager(Topology(args.sites, args.variables), out=sink, policy=args.policy)
+    server = Server(tm, sink)
+    totals = {'requests': 0, 'commits': 0, 'aborts': 0}
+
+    async def run(path):
+        listener = await serve(server, path=path)
+        async with listener:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(k, args, path, totals) for k in range(args.clients)))
+            return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed = asyncio.run(run(os.path.join(tmp, 'repcrec.sock')))
+    latencies = sorted(l for stats in server.clients for l in stats.latencies)
+    n = len(latencies)
+    ended = totals['commits'] + totals['aborts']
+    print("{} clients, {} requests in {:.3f}s: {:.0f} requests/s, {:.0f} commits/s, {:.1%} aborted".format(
+        args.clients, totals['requests'], elapsed, totals['requests'] / elapsed, totals['commits'] / elapsed,
+        totals['aborts'] / ended if ended else 0))
+    print("latency p50 {:.3f}ms p99 {:.3f}ms max {:.3f}ms".format(
+        latencies[n // 2] * 1e3, latencies[min(n - 1, n * 99 // 100)] * 1e3, latencies[-1] * 1e3))
+    worst = max(server.report(), key=lambda summary: summary.get('p99_ms', 0))
+    print("slowest client {} p99 {:.3f}ms".format(worst['client'], worst['p99_ms']))
+
+def recovery(args):
+    """
+    Measure commit throughput with the write-ahead log and the time to restore the sites from it,
+    for growing histories with and without checkpoints.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    topology = Topology(args.sites, args.variables)
+    rand = random.Random(args.seed)
+    print("{:<10} {:>12} {:>12} {:>12} {:>10} {:>14}".format(
+        'commits', 'checkpoint', 'commits/s', 'replayed', 'values', 'restore (ms)'))
+    for commits in args.history:
+        lines = []
+        for j in range(commits):
+            lines.append("begin(T{})".format(j))
+            for _ in range(args.ops):
+                lines.append("W(T{},x{},{})".format(j, rand.randint(1, args.variables), rand.randint(0, 9999)))
+            lines.append("end(T{})".format(j))
+        instructions = list(parse(lines))
+        for interval in (args.checkpoint_interval, None):
+            with tempfile.TemporaryDirectory() as wal:
+                # Without checkpoints the whole history is replayed
+                options = {'wal': wal, 'fsync_interval': args.fsync_interval,
+                           'checkpoint_interval': interval or commits + 1}
+                tm = TransactionManager(topology, out=CountingSink(), **options)
+                start = time.perf_counter()
+                for instruction in instructions:
+                    tm.execute(instruction)
+                tm.close()
+                elapsed = time.perf_counter() - start
+                restored = TransactionManager(topology, out=CountingSink(), **options)
+                restored.close()
+                stats = restored.recovery
+                print("{:<10} {:>12} {:>12.0f} {:>12} {:>10} {:>14.2f}".format(
+                    commits, interval or 'none', commits / elapsed, stats['records'], stats['checkpointed'],
+                    stats['seconds'] * 1e3))
+
+def snapshot(args):
+    """
+    Compare building a transaction manager from scratch with saving and loading a binary snapshot of it.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    topology = Topology(args.sites, args.variables)
+    start = time.perf_counter()
+    tm = TransactionManager(topology, out=CountingSink())
+    built = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'state.snap')
+        start = time.perf_counter()
+        tm.save(path)
+        saved = time.perf_counter() - start
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        TransactionManager.load(path, CountingSink())
+        loaded = time.perf_counter() - start
+    print("{} sites, {} variables: build {:.3f}s, save {:.3f}s, load {:.3f}s, snapshot {:.1f} MiB".format(
+        args.sites, args.variables, built, saved, loaded, size / 2**20))
+
+def escalation(args):
+    """
+    Measure bulk transactions scanning every variable while short transactions run beside them, 
+    with variable locks only and with lock escalation at each threshold: throughput, lock managers created, 
+    the peak number of locks held, and the peak number of waits-for edges.
+
+    Args:
+        args (Namespace): Command line arguments
+    """
+    rand = random.Random(args.seed)
+    lines = []
+    for j in range(args.bulk):
+        lines.append("begin(B{})".format(j))
+        for i in range(1, args.variables + 1):
+            if rand.random() < args.write_ratio:
+                lines.append("W(B{},x{},{})".format(j, i, rand.randint(0, 9999)))
+            else:
+                lines.append("R(B{},x{})".format(j, i))
+            # Short transactions of one operation each, mostly on variables the scan has not reached yet
+            if i % args.short_every == 0:
+                t_id = "S{}_{}".format(j, i)
+                v = rand.randint(1, args.variables)
+                lines.append("begin({})".format(t_id))
+                lines.append("R({},x{})".format(t_id, v) if rand.random() < 0.5 else "W({},x{},{})".format(t_id, v, j))
+                lines.append("end({})".format(t_id))
+        lines.append("end(B{})".format(j))
+    instructions = list(parse(lines))
+    topology = Topology(args.sites, args.variables)
+    print("{:<12} {:>9} {:>12} {:>8} {:>8} {:>14} {:>11} {:>11}".format(
+        'escalation', 'time (s)', 'ops/s', 'commits', 'aborts', 'lock managers', 'peak locks', 'peak edges'))
+    for threshold in [None] + args.thresholds:
+        sink = CountingSink()
+        tm = TransactionManager(topology, out=sink, escalation=threshold)
+        peak_locks = peak_edges = 0
+        start = time.perf_counter()
+        sampled = 0.0
+        for k, instruction in enumerate(instructions):
+            tm.execute(instruction)
+            # Sampling is left out of the measured time
+            if k % args.sample == 0:
+                mark = time.perf_counter()
+                peak_locks = max(peak_locks, sum(1 for dm in tm.dm_list for lm in dm.lock_table.values() if lm.lock))
+                peak_edges = max(peak_edges, sum(tm.graph.count.values()))
+                sampled += time.perf_counter() - mark
+        elapsed = time.perf_counter() - start - sampled
+        print("{:<12} {:>9.3f} {:>12.0f} {:>8} {:>8} {:>14} {:>11} {:>11}".format(
+            threshold or 'off', elapsed, len(instructions) / elapsed, sink.counts[EventType.COMMIT], 
+            sink.counts[EventType.ABORT], sum(len(dm.lock_table) for dm in tm.dm_list), peak_locks, peak_edges))
+
+def add_workload_arguments(parser):
+    """
+    Add the arguments selecting the workload of a benchmark.
+
+    Args:
+        parser (ArgumentParser): Parser of the benchmark
+    """
+    parser.add_argument('--trace', help='run a recorded trace instead of a generated workload')
+    parser.add_argument('--transactions', type=int, default=10000, help='number of transactions')
+    parser.add_argument('--sites', type=int, default=10, help='number of sites')
+    parser.add_argument('--variables', type=int, default=20, help='number of variables')
+    parser.add_argument('--concurrency', type=int, default=10, help='maximum active transactions')
+    parser.add_argument('--ops', type=int, default=5, help='mean operations per transaction')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='fraction of writes')
+    parser.add_argument('--ro-fraction', type=float, default=0.1, help='fraction of read-only transactions')
+    parser.add_argument('--skew', choices=WorkloadGenerator.SKEWS, default='uniform', help='key distribution')
+    parser.add_argument('--fail-every', type=int, default=0, help='ticks between failure storms, 0 for none')
+    parser.add_argument('--storm-size', type=int, default=1, help='sites failed per storm')
+    parser.add_argument('--recover-after', type=int, default=10, help='ticks until failed sites recover')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+
+if __name__ == '__main__':
+    """
+    Run a benchmark selected on the command line.
+    """
+    parser = argparse.ArgumentParser(description='RepCRec benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_memory = commands.add_parser('memory', help='memory of the record types')
+    parser_memory.add_argument('--count', type=int, default=100000, help='objects allocated per record type')
+    parser_memory.add_argument('--versions', type=int, default=1000000, help='committed versions in the version chain')
+    parser_memory.set_defaults(run=memory)
+
+    parser_throughput = commands.add_parser('throughput', help='operations, commits, and aborts per second')
+    add_workload_arguments(parser_throughput)
+    parser_throughput.add_argument('--gc', choices=[m.value for m in GCMode], default=GCMode.COMMIT.value,
+                                   help='multiversion garbage collection')
+    parser_throughput.add_argument('--columnar', action='store_true', help='keep committed values in flat arrays')
+    parser_throughput.add_argument('--repeat', type=int, default=3, help='number of runs')
+    parser_throughput.add_argument('--policy', choices=[p.value for p in PolicyType], default=PolicyType.DETECTION.value,
+                                   help='handling of lock conflicts')
+    parser_throughput.add_argument('--group-window', type=int, default=1, help='ticks over which commits are grouped')
+    parser_throughput.set_defaults(run=throughput)
+
+    parser_policies = commands.add_parser('policies', help='abort rate and throughput of each concurrency policy')
+    add_workload_arguments(parser_policies)
+    parser_policies.add_argument('--repeat', type=int, default=3, help='runs per policy, the fastest is reported')
+    parser_policies.set_defaults(run=policies)
+
+    parser_replicas = commands.add_parser('replicas', help='read distribution and lock queues of each replica selection')
+    add_workload_arguments(parser_replicas)
+    parser_replicas.set_defaults(run=replicas)
+
+    parser_service = commands.add_parser('service', help='end-to-end throughput and latency of the service')
+    parser_service.add_argument('--clients', type=int, default=16, help='concurrent clients')
+    parser_service.add_argument('--transactions', type=int, default=200, help='transactions per client')
+    parser_service.add_argument('--sites', type=int, default=10, help='number of sites')
+    parser_service.add_argument('--variables', type=int, default=20, help='number of variables')
+    parser_service.add_argument('--ops', type=int, default=5, help='mean operations per transaction')
+    parser_service.add_argument('--write-ratio', type=float, default=0.5, help='fraction of writes')
+    parser_service.add_argument('--policy', choices=[p.value for p in PolicyType], default=PolicyType.DETECTION.value,
+                                help='handling of lock conflicts')
+    parser_service.add_argument('--seed', type=int, default=0, help='random seed')
+    parser_service.set_defaults(run=service)
+
+    parser_recovery = commands.add_parser('recovery', help='commit throughput with the write-ahead log and restore time')
+    parser_recovery.add_argument('--history', type=int, nargs='+', default=[1000, 10000, 50000], 
+                                 help='committed transactions before the restart')
+    parser_recovery.add_argument('--checkpoint-interval', type=int, default=1000, help='commits of a site between checkpoints')
+    parser_recovery.add_argument('--fsync-interval', type=int, default=64, help='commits of a site between log syncs')
+    parser_recovery.add_argument('--sites', type=int, default=10, help='number of sites')
+    parser_recovery.add_argument('--variables', type=int, default=20, help='number of variables')
+    parser_recovery.add_argument('--ops', type=int, default=3, help='writes per transaction')
+    parser_recovery.add_argument('--seed', type=int, default=0, help='random seed')
+    parser_recovery.set_defaults(run=recovery)
+
+    parser_snapshot = commands.add_parser('snapshot', help='time to build, save, and load a transaction manager')
+    parser_snapshot.add_argument('--sites', type=int, default=10, help='number of sites')
+    parser_snapshot.add_argument('--variables', type=int, default=100000, help='number of variables')
+    parser_snapshot.set_defaults(run=snapshot)
+
+    parser_escalation = commands.add_parser('escalation', help='lock objects and throughput of bulk scans with lock escalation')
+    parser_escalation.add_argument('--thresholds', type=int, nargs='+', default=[16, 256], 
+                                   help='variables touched at a site before escalation')
+    parser_escalation.add_argument('--bulk', type=int, default=20, help='bulk transactions, run one after another')
+    parser_escalation.add_argument('--sites', type=int, default=10, help='number of sites')
+    parser_escalation.add_argument('--variables', type=int, default=2000, help='number of variables')
+    parser_escalation.add_argument('--write-ratio', type=float, default=0.2, help='fraction of writes of the scans')
+    parser_escalation.add_argument('--short-every', type=int, default=50, help='scan operations between two short transactions')
+    parser_escalation.add_argument('--sample', type=int, default=100, help='instructions between two samples of the lock table')
+    parser_escalation.add_argument('--seed', type=int, default=0, help='random seed')
+    parser_escalation.set_defaults(run=escalation)
+
+    args = parser.parse_args()
+    args.run(args)
@@ -4,106 +4,117 @@ Due on Saturday, 12/03/2022
 Author: Wonkwon Lee, Young Il Kim
 """
 
+import argparse
 import sys
 import TransactionManager
-
-ts = 0
+from Config import EventType, GCMode, PlacementType, PolicyType, ReplicaType, SinkType, Topology
+from EventSink import make_sink
+from InputParser import ParseError, read_instructions
+from Profiler import Profiler
 
 if __name__ == '__main__':
     """
     Main function to run the program.
-    Read the input file from the command line and process each operation.
-    Main checks number of inputs and check if the input file exists.
+    Read the input file (or standard input) from the command line lazily and process each operation.
     """
-    if len(sys.argv) != 2:
-        print('INCORRECT INPUT')
+    parser = argparse.ArgumentParser(description='Replicated Concurrency Control and Recovery')
+    parser.add_argument('input', nargs='?', default='-', help='input file (default standard input)')
+    parser.add_argument('--topology', help='JSON file with sites, variables, replication, and placement')
+    parser.add_argument('--sites', type=int, help='number of sites (default 10)')
+    parser.add_argument('--variables', type=int, help='number of variables (default 20)')
+    parser.add_argument('--replication', type=int, help='copies of each replicated variable (default all sites)')
+    parser.add_argument('--placement', choices=[p.value for p in PlacementType], 
+                        help='placement of replicated variables (default all)')
+    parser.add_argument('--gc', choices=[m.value for m in GCMode], default=GCMode.COMMIT.value,
+                        help='multiversion garbage collection: off, at commit time, or periodic sweep (default commit)')
+    parser.add_argument('--gc-interval', type=int, default=1000, help='commits between two sweeps (default 1000)')
+    parser.add_argument('--columnar', action='store_true', 
+                        help='keep the latest committed values of each site in flat arrays (integer values only)')
+    parser.add_argument('--output', choices=[k.value for k in SinkType], default=SinkType.TEXT.value,
+                        help='output format: text, JSON Lines, or none for benchmarking (default text)')
+    parser.add_argument('--batch', type=int, default=4096, help='events buffered before output is written (default 4096)')
+    parser.add_argument('--policy', choices=[p.value for p in PolicyType], default=PolicyType.DETECTION.value,
+                        help='lock conflicts: deadlock detection, wait-die, or wound-wait (default detection)')
+    parser.add_argument('--detect-interval', type=int, default=1, 
+                        help='minimum ticks between two deadlock detections (default 1, every tick with a new wait)')
+    parser.add_argument('--detect-age', type=int, 
+                        help='ticks after which a new wait is checked for deadlock regardless of the interval')
+    parser.add_argument('--site-workers', type=int, default=1, 
+                        help='threads running site-local work such as commit, abort, and dump (default 1)')
+    parser.add_argument('--wal', metavar='DIR', 
+                        help='log commits of each site to DIR and restore the committed values logged by an earlier run')
+    parser.add_argument('--fsync-interval', type=int, default=64, help='commits of a site between two log syncs (default 64)')
+    parser.add_argument('--checkpoint-interval', type=int, default=4096, 
+                        help='commits of a site between two log checkpoints (default 4096)')
+    parser.add_argument('--group-window', type=int, default=1, 
+                        help='ticks over which commits are buffered and applied together (default 1, no grouping)')
+    parser.add_argument('--replicas', choices=[r.value for r in ReplicaType], default=ReplicaType.FIRST.value,
+                        help='site serving a read of a replicated variable: first running site, round-robin, '
+                             'least-queued, or sticky per transaction (default first)')
+    parser.add_argument('--escalation', type=int, metavar='N', 
+                        help='escalate the variable locks of a transaction to a site lock once it touches N variables '
+                             'of the site (default off)')
+    parser.add_argument('--snapshot', metavar='PATH', help='save a binary snapshot of the state to PATH after the run')
+    parser.add_argument('--snapshot-at', type=int, metavar='TICK', 
+                        help='with --snapshot, save it after instruction TICK instead of after the run')
+    parser.add_argument('--resume', metavar='PATH', 
+                        help='start from the snapshot at PATH and skip the instructions it already ran')
+    parser.add_argument('--profile', metavar='REPORT', 
+                        help='write wall time and calls per phase and operation type as JSON to REPORT (- for standard error)')
+    parser.add_argument('--cprofile', action='store_true', help='with --profile, also list the top functions from cProfile')
+    options = parser.parse_args()
+
+    settings = {k: v for k, v in vars(options).items() 
+                if k in ('sites', 'variables', 'replication', 'placement') and v is not None}
+    try:
+        topology = Topology.load(options.topology, **settings) if options.topology else Topology(**settings)
+    except (OSError, ValueError, TypeError) as e:
+        print('INCORRECT TOPOLOGY: {}'.format(e))
         sys.exit(1)
 
-    inputSource = sys.stdin
-    fileName = open(sys.argv[1], 'r')
-    if fileName.mode == 'r':
-        inputSource = fileName.readlines()
-
-    tm = TransactionManager.TransactionManager()
-    if fileName:
-        #print("INPUT :: {}".format(inputSource))
+    out = make_sink(options.output, sys.stdout, options.batch)
+    if options.resume:
         try:
-            #print("OPEN SUCCESSFULLY :: {}".format(inputSource))
-            """
-            Start Parsing and look for operation : begin, beginRO, W, R, fail, recover, end, dump
-            Look for a deadlock before operation. 
-            """
-            for line in inputSource:
-                if line == "":
-                    continue
-                
-                newLine = line.split('//')[0].strip()
-                if len(newLine) == 0:
-                    continue
-                elif newLine.startswith('quit'):
-                    break
-                elif newLine.startswith('==='):
-                    break
-                
-                temp = newLine.strip().strip(')')
-                temp = temp.split('(')
-                method = temp[0]
-
-                ts += 1
-                
-                if tm.check_deadlock():
-                    #  print("DEADLOCK DETECTED!")
-                     tm.run_operation()
-
-                if method == "begin":
-                    p1 = temp[1]
-                    print(method, p1)
-                    tm.begin(p1)
-
-                elif method == "beginRO":
-                    p1 = temp[1]
-                    print(method, p1)
-                    tm.beginRO(p1)
-
-                elif method == "W":
-                    args = temp[1].split(',')
-                    p1 = args[0]
-                    p2 = args[1]
-                    p3 = args[2]
-                    print(method, p1, p2, p3)
-                    tm.write_operation(p1, p2, p3)
-
-                elif method == "R":
-                    args = temp[1].split(',')
-                    p1 = args[0]
-                    p2 = args[1]
-                    print(method, p1, p2)
-                    tm.read_operation(p1, p2)
-
-                elif method == "fail":
-                    p1 = temp[1]
-                    print(method, p1)
-                    tm.fail(p1)
-
-                elif method == "recover":
-                    p1 = temp[1]
-                    print(method, p1)
-                    tm.recover(p1)
-
-                elif method == "end":
-                    p1 = temp[1]
-                    print(method, p1)
-                    tm.end(p1)
-
-                elif method == "dump":
-                    print(method)
-                    tm.dump()
-                    
-                else:
-                    print("Unrecognized command. Abort the program")
-                    break
-
-                tm.run_operation()
-
-        except IOError:
-            print("CAN'T OPEN FILE {}".format(inputSource))
+            tm = TransactionManager.TransactionManager.load(options.resume, out, options.site_workers)
+        except (OSError, ValueError, EOFError) as e:
+            print('INCORRECT SNAPSHOT: {}'.format(e))
+            sys.exit(1)
+    else:
+        tm = TransactionManager.TransactionManager(topology, options.gc, options.gc_interval, options.columnar, out,
+                                                   options.policy, options.detect_interval, options.detect_age,
+                                                   options.site_workers, options.wal, options.fsync_interval,
+                                                   options.checkpoint_interval, options.group_window,
+                                                   options.replicas, options.escalation)
+    if tm.recovery and tm.recovery['checkpointed'] + tm.recovery['records']:
+        sys.stderr.write("Restored {checkpointed} checkpointed values and {records} logged commits "
+                         "in {seconds:.3f}s\n".format(**tm.recovery))
+    profiler = None
+    if options.profile:
+        profiler = Profiler(options.cprofile)
+        profiler.instrument(tm)
+        profiler.begin()
+    try:
+        """
+        Start Parsing and look for operation : begin, beginRO, W, R, fail, recover, end, dump
+        Look for a deadlock before operation. 
+        """
+        skip = tm.ticks     # Instructions already run by a resumed snapshot
+        for k, instruction in enumerate(read_instructions(options.input), 1):
+            if k <= skip:
+                continue
+            tm.execute(instruction)
+            if options.snapshot and options.snapshot_at == k:
+                tm.save(options.snapshot)
+    except ParseError:
+        out.emit(EventType.ERROR, message="Unrecognized command. Abort the program")
+    except IOError:
+        out.emit(EventType.ERROR, message="CAN'T OPEN FILE {}".format(options.input))
+    finally:
+        tm.commit_group()
+        out.flush()
+        if options.snapshot and options.snapshot_at is None:
+            tm.save(options.snapshot)
+        tm.close()
+        if profiler:
+            profiler.end()
+            profiler.write(options.profile)
@@ -0,0 +1,46 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import random
+import pytest
+from Config import PlacementType, Topology
+from ColumnStore import inconsistent
+from EventSink import CountingSink
+from TransactionManager import TransactionManager
+
+def conflicting(stores):
+    """
+    Find the variables whose readable replicas disagree by comparing every readable value.
+
+    Args:
+        stores (list[ColumnStore]): Column stores of the running sites
+
+    Returns:
+        list[int]: Sorted variable numbers with conflicting values
+    """
+    values = {}
+    for store in stores:
+        for i, val, readable in zip(store.numbers, store.values, store.readable):
+            if readable:
+                values.setdefault(i, set()).add(val)
+    return sorted(i for i, vals in values.items() if len(vals) > 1)
+
+@pytest.mark.parametrize('placement', list(PlacementType))
+@pytest.mark.parametrize('seed', range(5))
+def test_inconsistent_matches_every_replica(placement, seed):
+    """
+    Replicas compared block by block disagree on the same variables as replicas compared one by one.
+    """
+    rng = random.Random(seed)
+    tm = TransactionManager(Topology(6, 5000, replication=3, placement=placement), out=CountingSink(), columnar=True)
+    stores = [dm.store for dm in tm.dm_list]
+    for step in range(300):
+        store = rng.choice(stores)
+        if step % 100 == 50:
+            store.recover()
+        v_id = rng.choice(list(store.slot))
+        store.commit(v_id, rng.choice([int(v_id[1:]) * 10, -1]), step)
+    assert inconsistent(stores) == conflicting(stores)
+    assert inconsistent(stores[1:]) == conflicting(stores[1:])
@@ -0,0 +1,63 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import asyncio
+import json
+import os
+from Config import Topology
+from Server import Server, ServerSink, serve
+from TransactionManager import TransactionManager
+
+def pipeline(path: str, lines: list):
+    """
+    Serve one transaction manager on a Unix socket and send instructions from one client without waiting for responses.
+
+    Args:
+        path (str): Unix socket path
+        lines (list[str]): Instructions, one per request
+
+    Returns:
+        dict: Request ID -> response
+    """
+    async def run():
+        sink = ServerSink()
+        server = Server(TransactionManager(Topology(), out=sink), sink)
+        listener = await serve(server, path=path)
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write("".join(line + "\n" for line in lines + ['quit']).encode())
+            await writer.drain()
+            responses = {}
+            while len(responses) < len(lines):
+                response = json.loads(await asyncio.wait_for(reader.readline(), 5))
+                responses[response['id']] = response
+            writer.close()
+            return responses
+    return asyncio.run(run())
+
+def test_blocked_operation_gets_its_own_response(tmp_path):
+    """
+    A blocked write and a later read of the same transaction complete out of order, and each gets its own event.
+    """
+    lines = ["begin(T1)", "begin(T2)", "W(T2,x1,5)", "W(T1,x1,7)", "R(T1,x4)", "end(T2)"]
+    responses = pipeline(os.path.join(str(tmp_path), 'server.sock'), lines)
+    write, = responses[4]['events']
+    assert (write['event'], write['t_id'], write['v_id'], write['val']) == ('write', 'T1', 'x1', 7)
+    read, = responses[5]['events']
+    assert (read['event'], read['t_id'], read['v_id'], read['val']) == ('read', 'T1', 'x4', 40)
+    assert [e['event'] for e in responses[6]['events']] == ['commit', 'write']
+
+def test_abort_answers_every_pending_operation(tmp_path):
+    """
+    Every pending operation of a transaction aborted by deadlock detection is answered with the abort.
+    """
+    lines = ["begin(T1)", "begin(T2)", "W(T1,x1,1)", "W(T1,x3,3)", "W(T2,x2,2)", "W(T2,x1,4)", "W(T2,x3,6)", "W(T1,x2,5)", 
+             "end(T1)"]
+    responses = pipeline(os.path.join(str(tmp_path), 'server.sock'), lines)
+    for seq in (6, 7):
+        aborted, = responses[seq]['events']
+        assert (aborted['event'], aborted['t_id']) == ('abort', 'T2')
+    write, = responses[8]['events']
+    assert (write['event'], write['t_id'], write['val']) == ('write', 'T1', 5)
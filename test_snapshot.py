@@ -0,0 +1,42 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import os
+from Config import Topology
+from EventSink import CountingSink
+from InputParser import parse
+from TransactionManager import TransactionManager
+
+def variables(table: dict):
+    """
+    Describe every variable of a site by its flags, committed values, and temporary value.
+
+    Args:
+        table (dict): Variables stored at the site
+
+    Returns:
+        list: Variable ID, flags, commit timestamps, committed values, and temporary value of each variable
+    """
+    return [(k, v.replicated, v.readable, v.fail, v.ts_list, [c.val for c in v.val_list],
+             v.temp and (v.temp.val, v.temp.t_id)) for k, v in table.items()]
+
+def test_loaded_variables_are_created_on_lookup(tmp_path):
+    """
+    A loaded site creates only the variables looked up, and ends up with the same variables as the saved one.
+    """
+    tm = TransactionManager(Topology(), out=CountingSink())
+    for instruction in parse(["begin(T1)", "W(T1,x2,5)", "W(T1,x1,3)", "end(T1)", "fail(3)", "recover(3)",
+                              "begin(T2)", "W(T2,x4,7)"]):
+        tm.execute(instruction)
+    path = os.path.join(str(tmp_path), 'state.snap')
+    tm.save(path)
+    loaded = TransactionManager.load(path, CountingSink())
+    site = loaded.dm_list[1].data_table
+    assert len(site) == len(tm.dm_list[1].data_table)
+    assert 'x1' in site and 'x3' not in site and 'x21' not in site
+    assert site['x1'].current().val == 3
+    assert 'x6' not in dict.keys(site)
+    for saved, dm in zip(tm.dm_list, loaded.dm_list):
+        assert variables(dm.data_table) == variables(saved.data_table)
@@ -0,0 +1,155 @@
+"""
+Due on Saturday, 12/03/2022
+
+Author: Wonkwon Lee, Young Il Kim
+"""
+import glob
+import os
+import re
+import shlex
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Variable line of the expected dump: "x2: 102 at all sites" or "x1: 101 at site 2"
+EXPECTED = re.compile(r'(x\d+): (-?\d+) at (?:all sites|site (\d+))')
+DUMP = re.compile(r'Site (\d+) - \w+((?: x\d+ : -?\d+)*)')
+# Line of the expected reads: "T2 reads x3: 30 at site 4"
+EXPECTED_READ = re.compile(r'(T\d+) reads (x\d+): (-?\d+) at site (\d+)')
+READ = re.compile(r'Transaction (\S+) reads variable (x\d+) of (-?\d+) on site (\d+)')
+
+def read(path: str):
+    """
+    Read a trace.
+
+    Args:
+        path (str): Path of the trace
+
+    Returns:
+        str: Text of the trace
+    """
+    with open(path) as f:
+        return f.read()
+
+def traces(name: str='output of dump'):
+    """
+    Find the traces that list an expected section of their output.
+
+    Args:
+        name (str, optional): Name of the section. Defaults to the output of the final dump.
+
+    Returns:
+        list[str]: Paths of the traces
+    """
+    return sorted(path for path in glob.glob(os.path.join(ROOT, 'test', '*'))
+                  if os.path.isfile(path) and '=== ' + name in read(path))
+
+def section(text: str, name: str):
+    """
+    Get a section of a trace, from its "=== name" line to the next section.
+
+    Args:
+        text (str): Text of the trace
+        name (str): Name of the section
+
+    Returns:
+        str: Text of the section, empty if the trace does not have it
+    """
+    parts = text.split('=== ' + name, 1)
+    return parts[1].split('\n===', 1)[0] if len(parts) > 1 else ''
+
+def expectation(path: str):
+    """
+    Read the command line options and the expected dump of a trace.
+    Options are given on a "// Options:" line of the header.
+
+    Args:
+        path (str): Path of the trace
+
+    Returns:
+        tuple: Options, variable ID -> (value, site ID or None for all sites), and whether all other variables
+            keep their initial values
+    """
+    text = read(path)
+    options = re.search(r'^// Options:(.*)$', text, re.M)
+    expected = section(text, 'output of dump')
+    values = {m.group(1): (int(m.group(2)), m.group(3) and int(m.group(3))) for m in EXPECTED.finditer(expected)}
+    return shlex.split(options.group(1)) if options else [], values, 'All other variables' in expected
+
+def final_dump(output: str):
+    """
+    Parse the last dump of every site from the text output.
+
+    Args:
+        output (str): Text output of main.py
+
+    Returns:
+        dict: Site ID -> variable ID -> value
+    """
+    sites = {}
+    for m in DUMP.finditer(output):
+        pairs = m.group(2).split()
+        sites[int(m.group(1))] = {pairs[i]: int(pairs[i + 2]) for i in range(0, len(pairs), 3)}
+    return sites
+
+@pytest.mark.parametrize('path', traces(), ids=os.path.basename)
+def test_trace_dump(path):
+    """
+    Run a trace with its options and compare its final dump with the expected one.
+
+    Args:
+        path (str): Path of the trace
+    """
+    options, values, initial = expectation(path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py')] + options + [path],
+                            capture_output=True, text=True, check=True)
+    sites = final_dump(result.stdout)
+    assert sites, "The trace does not dump"
+    for site_id, variables in sites.items():
+        for v_id, val in variables.items():
+            if v_id in values:
+                expected, at = values[v_id]
+                if at is None or at == site_id:
+                    assert val == expected, "{} at site {}".format(v_id, site_id)
+            elif initial:
+                assert val == int(v_id[1:]) * 10, "{} at site {}".format(v_id, site_id)
+
+def test_group_commit_emits_buffered_commits_before_abort():
+    """
+    A transaction that aborts at its end is reported after the buffered commits decided before it.
+    """
+    path = os.path.join(ROOT, 'test', 'test24')
+    options, _, _ = expectation(path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py')] + options + [path],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.index("Transaction T4 commits") < result.stdout.index("Transaction T3 aborts")
+
+@pytest.mark.parametrize('path', [path for path in traces() if '--escalation' in expectation(path)[0]], ids=os.path.basename)
+def test_escalation_keeps_output(path):
+    """
+    Run a trace with lock escalation and without it, and compare the outputs.
+
+    Args:
+        path (str): Path of the trace
+    """
+    options, _, _ = expectation(path)
+    k = options.index('--escalation')
+    outputs = [subprocess.run([sys.executable, os.path.join(ROOT, 'main.py')] + args + [path],
+                              capture_output=True, text=True, check=True).stdout 
+               for args in (options, options[:k] + options[k + 2:])]
+    assert outputs[0] == outputs[1]
+
+@pytest.mark.parametrize('path', traces('reads'), ids=os.path.basename)
+def test_trace_reads(path):
+    """
+    Run a trace with its options and compare every value it reads and the site it reads from with the expected reads, in order.
+
+    Args:
+        path (str): Path of the trace
+    """
+    options, _, _ = expectation(path)
+    expected = [m.groups() for m in EXPECTED_READ.finditer(section(read(path), 'reads'))]
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py')] + options + [path],
+                            capture_output=True, text=True, check=True)
+    assert [m.groups() for m in READ.finditer(result.stdout)] == expected